@@ -1,25 +1,40 @@
+import sys
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 from task import TaskFactory
 from interpreter import Interpreter, CommandParser, FlexibleTaskParser, FixedTaskParser
 from scheduler import ScheduleCommand, Scheduler, AddTaskCommand
 from task import TaskFactory
-from threading import Thread
+from background import BackgroundSearch, background_export, background_profile
 from strategy import SchedulingStrategy, EarliestSlotStrategy, SingleTaskPerDayAndStartAt9Strategy
+from store import ScheduleStore
 
 # This class is the GUI version of the command line app, it uses the same code but with more GUI connected elements.
+# Like the command line app it can be run with --profile, and with --cache FILE to keep the calculated schedules in
+# that file between runs.
 
 class SchedulerApp:
+    # How many schedules a calculation remembers, so going through a big one does not keep all of them in memory.
+    # One with fewer is kept and the next calculation after adding tasks builds on it.
+    MAX_KEPT = 10000
+
     # Initiation of variables.
-    def __init__(self, root):
+    def __init__(self, root, profile=False, store=None):
         self.root = root
+        self.profile = profile
+        self.store = store
         self.root.title("Task Scheduler")
         self.strategy = None
         self.scheduler = None
         self.flexible_tasks = []
         self.fixed_tasks = []
-        self.schedules = []
+        self.current_schedule = None
         self.current_schedule_index = 0
+        # the search running in the background, the schedules it found that were not shown yet wait on its queue
+        self.search = None
+        # the export running in the background, if there is one
+        self.export = None
+        self.status_label = None
 
         self.main_frame = None
         self.create_strategy_selection_page()
@@ -50,7 +65,7 @@ class SchedulerApp:
     # Receives a strategy and sets self.scheduler to a Scheduler with that provided strategy.
     def set_strategy(self, strategy_cls):
         self.strategy = strategy_cls()
-        self.scheduler = Scheduler(self.strategy)
+        self.scheduler = Scheduler(self.strategy, profile=self.profile, store=self.store)
         
         self.create_task_input_page()
 
@@ -98,7 +113,14 @@ class SchedulerApp:
 
         tk.Button(
             self.main_frame, text="Calculate Schedule", command=lambda:self.interpreter(CommandParser, "command")
-        ).grid(row=8, column=0, columnspan=2, pady=20)
+        ).grid(row=8, column=0, pady=20)
+
+        tk.Button(
+            self.main_frame, text="Cancel", command=self.cancel_search
+        ).grid(row=8, column=1, pady=20)
+
+        self.status_label = tk.Label(self.main_frame, text="")
+        self.status_label.grid(row=9, column=0, columnspan=2)
 
 
     # This method takes the class of type Interpreter and then builds an input string for the interpreter to
@@ -125,16 +147,67 @@ class SchedulerApp:
         else:
             self.calculate_schedule()
 
-    # This method places fixed tasks and generates the flexible schedules and goes to the page to display schedules.
+    # This method places fixed tasks and starts generating the flexible schedules in a background thread, so the
+    # window keeps responding while the search runs. poll_search picks up the schedules as they are found and goes to
+    # the page to display schedules as soon as the first one exists. A calculation after adding more tasks builds on
+    # the last one.
     def calculate_schedule(self):
-        self.scheduler.generate_fixed_schedule()
-        self.schedules = self.scheduler.generate_flexible_schedules()
-        print(self.schedules)
-        if not self.schedules:
-            messagebox.showinfo("No Schedules", "No possible schedules were found or only fixed tasks provided.")
+        self.cancel_search()
+        if self.scheduler.profile:
+            # profiling runs the whole calculation before the first schedule, the breakdown is printed to the console
+            self.search = background_profile(self.scheduler)
+        else:
+            self.search = BackgroundSearch(self.scheduler, self.scheduler.iter_calculation(self.MAX_KEPT))
+        self.current_schedule = None
+        self.current_schedule_index = 0
+        self.search.start()
+        self.update_status()
+        self.root.after(50, self.poll_search, self.search)
+
+    # Shows the first schedule as soon as it is found and updates the count, then runs again in a bit until the
+    # search is done. The other schedules stay on the search's queue until Next Schedule takes them. search is the
+    # search it was started for, so a poll for an older search stops. done is read before the queue, the worker has
+    # put all of its results on the queue by the time it is set, so the last poll still sees the first schedule.
+    def poll_search(self, search):
+        if search is not self.search:
+            return
+        done = search.done
+        if self.current_schedule is None:
+            self.current_schedule = search.next_result()
+            if self.current_schedule is not None:
+                self.show_schedule_page()
+            elif done and not search.cancelled and search.error is None:
+                messagebox.showinfo("No Schedules", "No possible schedules were found or only fixed tasks provided.")
+        self.update_status()
+        if not done:
+            self.root.after(50, self.poll_search, search)
+
+    # Shows how many schedules were found so far and whether the search is still going, or waiting for the ones on
+    # its queue to be looked at.
+    def update_status(self):
+        if self.status_label is None or self.search is None:
+            return
+        count = self.search.found
+        if self.search.cancelled:
+            text = "Cancelled, found " + str(count) + " schedules"
+        elif self.search.error is not None:
+            text = "Search failed: " + str(self.search.error)
+        elif self.search.done:
+            text = "Found all " + str(count) + " schedules"
+        elif self.search.queue.full():
+            text = "Found " + str(count) + " schedules so far, more are searched as you go through them"
         else:
-            self.current_schedule_index = 0
-            self.show_schedule_page()
+            text = "Searching... found " + str(count) + " schedules so far"
+        self.status_label.config(text=text)
+
+    # Stops the background search, the schedules found until then can still be looked through. It also stops an
+    # export that is running, poll_export then says so.
+    def cancel_search(self):
+        if self.export is not None:
+            self.export.cancel()
+        if self.search is not None and not self.search.done:
+            self.search.cancel()
+            self.update_status()
 
     # This metho builds the schedule page with a text box where the schedule can be printed.
     def show_schedule_page(self):
@@ -142,7 +215,10 @@ class SchedulerApp:
         self.main_frame = tk.Frame(self.root)
         self.main_frame.pack(padx=20, pady=20)
 
-        tk.Label(self.main_frame, text=f"Schedule {self.current_schedule_index + 1}", font=("Arial", 16)).pack(pady=10)
+        self.schedule_label = tk.Label(self.main_frame, text="", font=("Arial", 16))
+        self.schedule_label.pack(pady=10)
+        self.status_label = tk.Label(self.main_frame, text="")
+        self.status_label.pack()
 
         self.schedule_text = tk.Text(self.main_frame, height=20, width=50)
         self.schedule_text.pack(pady=10)
@@ -160,33 +236,84 @@ class SchedulerApp:
             command=self.save_schedule,
         ).pack(pady=10)
 
+        tk.Button(
+            self.main_frame,
+            text="Export All Schedules",
+            command=self.export_schedules,
+        ).pack(pady=10)
+
+        tk.Button(
+            self.main_frame,
+            text="Cancel",
+            command=self.cancel_search,
+        ).pack(pady=10)
+
     # This method actually displays that schedule by inserting in the box the output of the printing of the 
     # schedule at the current index.
     def display_schedule(self):
+        self.schedule_label.config(text=f"Schedule {self.current_schedule_index + 1}")
         self.schedule_text.delete(1.0, tk.END)
-        if len(self.schedules) == 0:
-            self.schedule_text.insert(self.scheduler.week.print_day_tasks())
+        if self.current_schedule is None:
+            self.schedule_text.insert('1.0', self.scheduler.week.print_day_tasks())
         else:
-            schedule = self.schedules[self.current_schedule_index]
-            string = schedule.week.print_day_tasks()
+            string = self.current_schedule.print_day_tasks()
             self.schedule_text.insert('1.0', string)
 
-    # This method increments the index and displays the next schedule.
+    # This method moves on to the next schedule the background search has found, increments the index and displays
+    # it.
     def next_schedule(self):
-        self.current_schedule_index += 1
-        if self.current_schedule_index >= len(self.schedules):
-            messagebox.showinfo("End of Schedules", "No more schedules available.")
-        else:
+        schedule = self.search.next_result()
+        if schedule is not None:
+            self.current_schedule_index += 1
+            self.current_schedule = schedule
             self.display_schedule()
+            self.update_status()
+        elif not self.search.finished():
+            messagebox.showinfo("Searching", "The next schedule has not been found yet, try again in a moment.")
+        else:
+            messagebox.showinfo("End of Schedules", "No more schedules available.")
 
     # This method saves the schedule but first asks the name of the file to save to.
     def save_schedule(self):
         answer = tk.simpledialog.askstring("Save file dialog", "What filename would you like to save to")
         with open(answer, 'w') as file:
-            schedule = self.schedules[self.current_schedule_index]
-            file.write(schedule.week.print_day_tasks())
+            file.write(self.current_schedule.print_day_tasks())
         print("Saved schedule successfully")
     
+    # This method streams every schedule to a file, the format is binary if the filename ends in .bin and JSON
+    # lines otherwise. The export runs in a background thread like the search, so the window keeps responding and
+    # Cancel stops it, and poll_export says how it went once it is over.
+    def export_schedules(self):
+        # the export runs its own search on the same scheduler, so it waits until the background one is over
+        if (self.search is not None and not self.search.done) or self.export is not None:
+            messagebox.showinfo("Searching", "Wait for the search or export to finish or cancel it before exporting.")
+            return
+        answer = tk.simpledialog.askstring("Export file dialog", "What filename would you like to export all schedules to")
+        if not answer:
+            return
+        file_format = "binary" if answer.endswith(".bin") else "jsonl"
+        self.export = background_export(self.scheduler, answer, file_format)
+        self.export.start()
+        self.status_label.config(text="Exporting to " + answer + "...")
+        self.root.after(50, self.poll_export, self.export, answer)
+
+    # Checks whether the export is over, and runs again in a bit until it is. Then it shows how many schedules were
+    # written, or that it was cancelled or failed.
+    def poll_export(self, export, filename):
+        if export is not self.export:
+            return
+        if not export.done:
+            self.root.after(50, self.poll_export, export, filename)
+            return
+        self.export = None
+        self.update_status()
+        if export.cancelled:
+            messagebox.showinfo("Export", "Export cancelled, " + filename + " only has the schedules written so far.")
+        elif export.error is not None:
+            messagebox.showerror("Export", "Export failed: " + str(export.error))
+        else:
+            messagebox.showinfo("Export", "Exported " + str(export.next_result()) + " schedules.")
+    
     # This method clears the screen.
     def clear_frame(self):
         if self.main_frame:
@@ -195,5 +322,8 @@ class SchedulerApp:
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = SchedulerApp(root)
+    store = None
+    if "--cache" in sys.argv[1:-1]:
+        store = ScheduleStore(sys.argv[sys.argv.index("--cache") + 1])
+    app = SchedulerApp(root, profile="--profile" in sys.argv[1:], store=store)
     root.mainloop()
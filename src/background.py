@@ -0,0 +1,83 @@
+from queue import Queue, Empty, Full
+from threading import Thread
+from scheduler import SearchCancelled
+
+# Runs a search in a background thread so the GUI stays responsive. The worker thread only pulls results from the
+# iterator and puts them on a queue, the thread that owns the GUI takes them off one at a time with next_result, so no
+# GUI calls are ever made from the worker. The queue holds at most queue_size results, when it is full the worker
+# waits until the GUI takes one, so the results that were not looked at yet never take more memory than that. found
+# is the running count of the results the worker has put on the queue.
+class BackgroundSearch:
+    def __init__(self, scheduler, results_iterator, queue_size=100):
+        self.scheduler = scheduler
+        self.queue = Queue(maxsize=queue_size)
+        self.found = 0
+        # set by the worker once it has finished, then cancelled and error say how it ended
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        # set by cancel, so a worker waiting for room on the queue stops waiting
+        self.stopping = False
+        self.thread = Thread(target=self.run, args=(results_iterator,), daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    # Runs in the worker thread. After cancel the results are no longer put on the queue, the next one pulled from a
+    # search raises SearchCancelled.
+    def run(self, results_iterator):
+        try:
+            for result in results_iterator:
+                while not self.stopping:
+                    try:
+                        self.queue.put(result, timeout=0.05)
+                        self.found += 1
+                        break
+                    except Full:
+                        pass
+            if self.stopping:
+                self.cancelled = True
+        except SearchCancelled:
+            self.cancelled = True
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done = True
+
+    # Takes the next result off the queue, or returns None if there is none yet.
+    def next_result(self):
+        try:
+            return self.queue.get_nowait()
+        except Empty:
+            return None
+
+    # Whether the worker has finished and every result has been taken. done is read first, the worker has put all
+    # of its results on the queue by the time it is set.
+    def finished(self):
+        return self.done and self.queue.empty()
+
+    # Asks the search to stop and waits for the worker to finish, which happens at the next node of the search. A
+    # search that is only starting in the worker clears cancel, so it is asked again until the worker is done.
+    def cancel(self):
+        self.stopping = True
+        while self.thread.is_alive():
+            self.scheduler.cancel()
+            self.thread.join(0.05)
+
+# Returns a BackgroundSearch that streams every flexible schedule of the scheduler to a file in its worker thread, see
+# Scheduler.export_flexible_schedules. Its one result is the number of schedules written, and cancelling it stops the
+# export with the schedules written until then in the file.
+def background_export(scheduler, filename, file_format):
+    def export():
+        yield scheduler.export_flexible_schedules(filename, file_format)
+    return BackgroundSearch(scheduler, export())
+
+# Returns a BackgroundSearch that runs Scheduler.profile_calculation in its worker thread, prints the breakdown to the
+# console once the calculation is over and then puts its schedules on the queue. The whole calculation is searched
+# before the first schedule comes, but the GUI keeps responding and cancel stops it.
+def background_profile(scheduler):
+    def profile():
+        results, profile_report = scheduler.profile_calculation()
+        print(profile_report.report())
+        yield from results
+    return BackgroundSearch(scheduler, profile())
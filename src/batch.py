@@ -0,0 +1,196 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from interpreter import FlexibleTaskParser, FixedTaskParser
+from cache import LRUCache
+from scheduler import Scheduler, AddTaskCommand
+from task import TaskFactory, FixedTask
+from week import Week
+from strategy import STRATEGIES
+
+# Headless batch mode. Each task file has one task per line in the same syntax as the command line app, for example
+#     fixed Work 8 MTWRF 9
+#     flexible Laundry 2
+# Blank lines and lines starting with # are skipped. Every file is scheduled on its own and all of its schedules are
+# written to one results file, with the files spread over a pool of worker processes. Run it from the src folder:
+#     python batch.py --strategy earliest --output-dir results week1.txt week2.txt
+# With --slot-minutes 15 the times in the files can be quarter hours like 9:15, and --weeks 2 schedules two weeks.
+
+# The file extension of the results file for each format.
+EXTENSIONS = {"jsonl": ".jsonl", "binary": ".bin", "text": ".txt"}
+
+# Reads the tasks of a task file with the interpreter classes, with times converted to slots of slot_minutes.
+# Raises ValueError with the line number if a line cannot be parsed.
+def load_tasks(filename, slot_minutes=60):
+    tasks = []
+    with open(filename) as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("flexible"):
+                interpreter = FlexibleTaskParser(slot_minutes)
+            elif line.startswith("fixed"):
+                interpreter = FixedTaskParser(slot_minutes)
+            else:
+                raise ValueError(filename + " line " + str(line_number) + ": not a fixed or flexible task")
+            try:
+                task_type, name, duration, start_time, days_of_week = interpreter.parse(line)
+            except (IndexError, ValueError):
+                raise ValueError(filename + " line " + str(line_number) + ": could not read the task")
+            tasks.append(TaskFactory.create_task(task_type, name, duration, days_of_week, start_time))
+    return tasks
+
+# Returns the name of the results file for an input file, in output_dir or next to the input if it is None. The name
+# always ends in .schedules and the format's extension, so a results file never replaces a task file.
+def output_filename(input_filename, output_dir, file_format):
+    base = os.path.splitext(os.path.basename(input_filename))[0] + ".schedules" + EXTENSIONS[file_format]
+    return os.path.join(output_dir if output_dir is not None else os.path.dirname(input_filename), base)
+
+# Schedules one task file and writes every schedule to output_filename. The text format has the rendered schedules
+# one after the other like 'save' writes them, the others are the export formats from export.py. Returns the number
+# of schedules written.
+def schedule_file(input_filename, output_filename, strategy_name, file_format="jsonl", slot_minutes=60, weeks=1):
+    schedule = Scheduler(STRATEGIES[strategy_name](slot_minutes), verbose=False, weeks=weeks)
+    for task in load_tasks(input_filename, slot_minutes):
+        AddTaskCommand(schedule, task).execute()
+    schedule.generate_fixed_schedule()
+    if file_format != "text":
+        return schedule.export_flexible_schedules(output_filename, file_format)
+    count = 0
+    with open(output_filename, 'w') as file:
+        for result in schedule.iter_flexible_schedules():
+            count += 1
+            file.write("Schedule " + str(count) + "\n")
+            file.write(result.print_day_tasks())
+    if count == 0:
+        # like the apps, with no flexible schedule the fixed schedule is the result
+        with open(output_filename, 'w') as file:
+            file.write(schedule.week.print_day_tasks())
+    return count
+
+# Runs one job in a worker process. Errors are sent back as text so one bad file does not stop the whole batch.
+def run_job(job):
+    input_filename, result_filename = job[:2]
+    try:
+        return input_filename, result_filename, schedule_file(*job), None
+    except (OSError, ValueError) as error:
+        return input_filename, result_filename, 0, str(error)
+
+# Schedules every input file with up to workers processes and returns a (input, output, count, error) tuple per file,
+# in the order of the inputs. error is None when the file was done.
+def run_batch(input_filenames, strategy_name, output_dir=None, file_format="jsonl", workers=None, slot_minutes=60,
+              weeks=1):
+    if strategy_name not in STRATEGIES:
+        raise ValueError("Unknown strategy.")
+    # checks the granularity and horizon once here instead of failing every file
+    Week(STRATEGIES[strategy_name](slot_minutes), weeks)
+    if file_format not in EXTENSIONS:
+        raise ValueError("Unknown export format.")
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    jobs = [(filename, output_filename(filename, output_dir, file_format), strategy_name, file_format, slot_minutes,
+             weeks) for filename in input_filenames]
+    if workers == 1 or len(jobs) <= 1:
+        return [run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_job, jobs))
+
+# The fixed tasks of a task list as something that can be compared and hashed: two task lists with the same key have
+# the same fixed week. The order is kept, since it decides which name shows where fixed tasks overlap.
+def fixed_layer_key(tasks):
+    return tuple((task.name, task.duration, task.start_time, task.days_of_week)
+                 for task in tasks if isinstance(task, FixedTask))
+
+# Slot caches of a worker process by strategy, granularity and horizon, so every job the process runs for that
+# strategy shares one cache. The slot lists only depend on the occupancy once those are the same.
+WORKER_SLOT_CACHES = {}
+
+def worker_slot_cache(strategy_name, slot_minutes, weeks, cache_size):
+    key = (strategy_name, slot_minutes, weeks)
+    if key not in WORKER_SLOT_CACHES:
+        WORKER_SLOT_CACHES[key] = LRUCache(cache_size)
+    return WORKER_SLOT_CACHES[key]
+
+# Runs the flexible searches of some users that share a fixed week. Returns the (user, results) pairs in the order of
+# the users. In a worker process slot_cache is None and the worker's cache is used.
+def run_users_job(job, slot_cache=None):
+    strategy_name, slot_minutes, weeks, fixed_week, users, limits, cache_size = job
+    if slot_cache is None:
+        slot_cache = worker_slot_cache(strategy_name, slot_minutes, weeks, cache_size)
+    found = []
+    for user, tasks in users:
+        schedule = Scheduler(fixed_week.strategy, verbose=False, cache_size=0, weeks=weeks)
+        for task in tasks:
+            AddTaskCommand(schedule, task).execute()
+        schedule.use_fixed_week(fixed_week, slot_cache)
+        found.append((user, schedule.generate_flexible_schedules(**limits)))
+    return found
+
+# Schedules the tasks of many users at once, task_sets maps each user to their list of tasks. Users often share most
+# of their fixed tasks, so the users are grouped by their fixed tasks (see fixed_layer_key) and the fixed week of each
+# group is only built once, here, and shared by all of its users. Each group is split into jobs of up to chunk_size
+# users that run on a pool of worker processes, and the users of a worker share its slot cache. limits are passed to
+# generate_flexible_schedules, like max_results=100, to bound the search of each user. Returns a dictionary from each
+# user to their list of ScheduleResult, in the order of task_sets.
+def schedule_users(task_sets, strategy_name, workers=None, slot_minutes=60, weeks=1, chunk_size=64,
+                   cache_size=4096, **limits):
+    if strategy_name not in STRATEGIES:
+        raise ValueError("Unknown strategy.")
+    strategy = STRATEGIES[strategy_name](slot_minutes)
+    layers = {}
+    for user, tasks in task_sets.items():
+        layers.setdefault(fixed_layer_key(tasks), []).append((user, list(tasks)))
+
+    jobs = []
+    for users in layers.values():
+        template = Scheduler(strategy, verbose=False, cache_size=0, weeks=weeks)
+        for task in users[0][1]:
+            if isinstance(task, FixedTask):
+                AddTaskCommand(template, task).execute()
+        template.generate_fixed_schedule()
+        for i in range(0, len(users), chunk_size):
+            jobs.append((strategy_name, slot_minutes, weeks, template.week, users[i:i + chunk_size], limits,
+                         cache_size))
+
+    if workers == 1 or len(jobs) <= 1:
+        slot_cache = LRUCache(cache_size)
+        found = [run_users_job(job, slot_cache) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            found = list(executor.map(run_users_job, jobs))
+    results = {}
+    for job_results in found:
+        results.update(job_results)
+    return {user: results[user] for user in task_sets}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schedule many task files without prompts.")
+    parser.add_argument("files", nargs="+", help="task files in the fixed/flexible line syntax")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="earliest")
+    parser.add_argument("--output-dir", help="folder for the results files, by default next to each input")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="jsonl", dest="file_format")
+    parser.add_argument("--workers", type=int, help="worker processes, by default one per CPU")
+    parser.add_argument("--slot-minutes", type=int, default=60, help="length of a slot, 60, 30, 15 or 5 minutes")
+    parser.add_argument("--weeks", type=int, default=1, help="how many weeks long the schedules are")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    try:
+        results = run_batch(args.files, args.strategy, args.output_dir, args.file_format, args.workers,
+                            args.slot_minutes, args.weeks)
+    except ValueError as error:
+        print(str(error), file=sys.stderr)
+        return 2
+    for input_filename, result_filename, count, error in results:
+        if error is not None:
+            failed += 1
+            print(input_filename + ": " + error, file=sys.stderr)
+        else:
+            print(input_filename + ": " + str(count) + " schedules -> " + result_filename)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,207 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from scheduler import Scheduler, AddTaskCommand
+from task import TaskFactory
+from strategy import STRATEGIES
+
+# Benchmark suite for the scheduling engine. Each workload is made up by a seeded generator, so the same workload is
+# the same tasks on every run, and the results are written as JSON so two runs can be compared to catch performance
+# regressions. Run it from the src folder:
+#     python benchmark.py --output before.json
+#     python benchmark.py --output after.json --compare before.json
+
+# fixed is the number of fixed blocks per day, spread evenly over the day, so more of them fragment the free time
+# into more and shorter gaps. fixed_hours is how long each block is, and days is on how many days of the week they
+# happen. flexible is the number of flexible tasks, with durations picked between min_duration and max_duration.
+# slot_minutes and weeks are optional and default to hour slots and one week, the durations of the flexible tasks are
+# counted in slots while fixed_hours stays in hours. durations is optional and gives the flexible durations instead.
+WORKLOADS = [
+    {"name": "earliest-sparse-3", "strategy": "earliest", "fixed": 1, "fixed_hours": 16, "days": 7,
+     "flexible": 3, "min_duration": 1, "max_duration": 3, "seed": 1},
+    {"name": "earliest-fragmented-3", "strategy": "earliest", "fixed": 4, "fixed_hours": 4, "days": 7,
+     "flexible": 3, "min_duration": 1, "max_duration": 2, "seed": 2},
+    {"name": "earliest-dense-6", "strategy": "earliest", "fixed": 1, "fixed_hours": 21, "days": 7,
+     "flexible": 6, "min_duration": 1, "max_duration": 3, "seed": 3},
+    {"name": "earliest-weekdays-3", "strategy": "earliest", "fixed": 1, "fixed_hours": 20, "days": 5,
+     "flexible": 3, "min_duration": 2, "max_duration": 4, "seed": 4},
+    {"name": "earliest-infeasible-6", "strategy": "earliest", "fixed": 2, "fixed_hours": 10, "days": 7,
+     "flexible": 6, "min_duration": 1, "max_duration": 3, "seed": 3},
+    {"name": "single-5", "strategy": "single", "fixed": 1, "fixed_hours": 9, "days": 2,
+     "flexible": 5, "min_duration": 1, "max_duration": 8, "seed": 5},
+    {"name": "single-infeasible-8", "strategy": "single", "fixed": 1, "fixed_hours": 9, "days": 0,
+     "flexible": 8, "min_duration": 1, "max_duration": 8, "seed": 6},
+    {"name": "earliest-quarter-hours-3", "strategy": "earliest", "fixed": 1, "fixed_hours": 22, "days": 7,
+     "flexible": 3, "min_duration": 2, "max_duration": 4, "seed": 7, "slot_minutes": 15},
+    {"name": "earliest-two-weeks-3", "strategy": "earliest", "fixed": 1, "fixed_hours": 22, "days": 7,
+     "flexible": 3, "min_duration": 1, "max_duration": 2, "seed": 8, "weeks": 2},
+]
+
+# Workloads that are only counted with count_flexible_schedules, they have far too many schedules to go through.
+# Many different durations are the slow case of the count. max_seconds is how long the count is expected to take at
+# most, main says so when it takes longer.
+COUNT_WORKLOADS = [
+    {"name": "count-distinct-12", "strategy": "earliest", "fixed": 1, "fixed_hours": 8, "days": 7,
+     "flexible": 12, "durations": list(range(1, 13)), "seed": 9, "max_seconds": 1.0},
+    {"name": "count-quarter-hours-10", "strategy": "earliest", "fixed": 1, "fixed_hours": 8, "days": 7,
+     "flexible": 10, "durations": list(range(1, 11)), "seed": 10, "slot_minutes": 15, "weeks": 4,
+     "max_seconds": 1.0},
+]
+
+# Makes the task list for a workload. The fixed blocks start at evenly spaced hours, and days picks which days of the
+# week they are on (the first ones, so days=5 is a work week).
+def generate_tasks(workload):
+    rng = random.Random(workload["seed"])
+    tasks = []
+    days_of_week = [day < workload["days"] for day in range(7)]
+    slots_per_hour = 60 // workload.get("slot_minutes", 60)
+    for block in range(workload["fixed"]):
+        start_time = block * 24 // workload["fixed"] * slots_per_hour
+        duration = min(workload["fixed_hours"] * slots_per_hour, 24 * slots_per_hour - start_time)
+        tasks.append(TaskFactory.create_task("fixed", "Fixed" + str(block), duration, days_of_week, start_time))
+    for i in range(workload["flexible"]):
+        if "durations" in workload:
+            duration = workload["durations"][i]
+        else:
+            duration = rng.randint(workload["min_duration"], workload["max_duration"])
+        tasks.append(TaskFactory.create_task("flexible", "Flexible" + str(i), duration, None))
+    return tasks
+
+def build_scheduler(workload):
+    scheduler = Scheduler(STRATEGIES[workload["strategy"]](workload.get("slot_minutes", 60)), verbose=False,
+                          weeks=workload.get("weeks", 1))
+    for task in generate_tasks(workload):
+        AddTaskCommand(scheduler, task).execute()
+    return scheduler
+
+# Runs one workload and returns its measurements: seconds for generate_fixed_schedule and for
+# generate_flexible_schedules (the fastest of repeat runs), schedules per second, and the peak memory of each of them,
+# fixed_peak_bytes for the fixed placement and peak_bytes for the flexible search. tracemalloc slows the search down a
+# lot, so the peak memory is measured in a separate run from the timings.
+def run_workload(workload, repeat=1):
+    fixed_seconds = None
+    flexible_seconds = None
+    for _ in range(repeat):
+        scheduler = build_scheduler(workload)
+        start = time.perf_counter()
+        scheduler.generate_fixed_schedule()
+        elapsed = time.perf_counter() - start
+        fixed_seconds = elapsed if fixed_seconds is None else min(fixed_seconds, elapsed)
+
+        start = time.perf_counter()
+        results = scheduler.generate_flexible_schedules()
+        elapsed = time.perf_counter() - start
+        flexible_seconds = elapsed if flexible_seconds is None else min(flexible_seconds, elapsed)
+        schedules = len(results)
+        nodes = scheduler.stats.nodes
+        del results
+
+    scheduler = build_scheduler(workload)
+    tracemalloc.start()
+    scheduler.generate_fixed_schedule()
+    fixed_peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    results = scheduler.generate_flexible_schedules()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del results
+
+    return {
+        "name": workload["name"],
+        "fixed_seconds": fixed_seconds,
+        "flexible_seconds": flexible_seconds,
+        "fixed_peak_bytes": fixed_peak_bytes,
+        "peak_bytes": peak_bytes,
+        "schedules": schedules,
+        "schedules_per_second": schedules / flexible_seconds if flexible_seconds > 0 else 0.0,
+        "nodes": nodes,
+    }
+
+# Runs one count workload and returns the number of schedules and the seconds count_flexible_schedules took (the
+# fastest of repeat runs).
+def run_count_workload(workload, repeat=1):
+    scheduler = build_scheduler(workload)
+    scheduler.generate_fixed_schedule()
+    count_seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = scheduler.count_flexible_schedules()
+        elapsed = time.perf_counter() - start
+        count_seconds = elapsed if count_seconds is None else min(count_seconds, elapsed)
+    return {
+        "name": workload["name"],
+        "count_seconds": count_seconds,
+        "max_seconds": workload["max_seconds"],
+        "count": count,
+    }
+
+def run_benchmarks(workloads=WORKLOADS, repeat=1, count_workloads=COUNT_WORKLOADS):
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [run_workload(workload, repeat) for workload in workloads],
+        "counts": [run_count_workload(workload, repeat) for workload in count_workloads],
+    }
+
+# Returns one line per workload in both runs with the time, the peak memory of the fixed placement and of the flexible
+# search, and the throughput of the new run relative to the old one, so a ratio above 1 for time or memory is a
+# slowdown. Runs from before fixed_peak_bytes was measured give a ratio of 0 for it.
+def compare(old, new):
+    old_results = {result["name"]: result for result in old["results"]}
+    lines = []
+    for result in new["results"]:
+        before = old_results.get(result["name"])
+        if before is None:
+            continue
+        time_ratio = result["flexible_seconds"] / before["flexible_seconds"] if before["flexible_seconds"] else 0.0
+        memory_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 0.0
+        fixed_memory_ratio = (result["fixed_peak_bytes"] / before["fixed_peak_bytes"]
+                              if before.get("fixed_peak_bytes") else 0.0)
+        lines.append("%-24s time x%.2f  fixed peak memory x%.2f  peak memory x%.2f  schedules/s %.0f -> %.0f" % (
+            result["name"], time_ratio, fixed_memory_ratio, memory_ratio, before["schedules_per_second"],
+            result["schedules_per_second"]))
+    old_counts = {result["name"]: result for result in old.get("counts", [])}
+    for result in new.get("counts", []):
+        before = old_counts.get(result["name"])
+        if before is None:
+            continue
+        time_ratio = result["count_seconds"] / before["count_seconds"] if before["count_seconds"] else 0.0
+        lines.append("%-24s count time x%.2f" % (result["name"], time_ratio))
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduling engine.")
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per workload, the fastest one is kept")
+    parser.add_argument("--only", action="append", help="only run the workloads with these names")
+    args = parser.parse_args(argv)
+
+    workloads = [workload for workload in WORKLOADS if not args.only or workload["name"] in args.only]
+    count_workloads = [workload for workload in COUNT_WORKLOADS if not args.only or workload["name"] in args.only]
+    report = run_benchmarks(workloads, args.repeat, count_workloads)
+    for result in report["results"]:
+        print("%-24s fixed %.4fs  flexible %.4fs  fixed peak %d bytes  peak %d bytes  %d schedules  %.0f schedules/s" % (
+            result["name"], result["fixed_seconds"], result["flexible_seconds"], result["fixed_peak_bytes"],
+            result["peak_bytes"], result["schedules"], result["schedules_per_second"]))
+    for result in report["counts"]:
+        print("%-24s count %.4fs  %d schedules%s" % (
+            result["name"], result["count_seconds"], result["count"],
+            "  over its budget of %.1fs" % result["max_seconds"] if result["count_seconds"] > result["max_seconds"] else ""))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            old = json.load(file)
+        for line in compare(old, report):
+            print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+import json
+import struct
+from array import array
+
+# These functions stream schedules to a file while they are being generated, so every combination can be dumped
+# for offline analysis without keeping them in memory. A schedule is written as the start hour of each flexible
+# task, in the same order as the tasks passed in.
+
+# The binary format starts with the magic bytes, a version byte and the number of tasks, then each task's duration
+# and name, then one record of little-endian unsigned 16 bit start hours per schedule. Without tasks the records are
+# empty, so the file ends with the number of schedules as a little-endian unsigned 64 bit number instead.
+BINARY_MAGIC = b"SCHD"
+BINARY_VERSION = 1
+# how many start hours are buffered before they are written out
+BINARY_BUFFER_SIZE = 1 << 16
+
+# Writes every tuple of start hours from starts_iter to filename in file_format ("jsonl" or "binary") and returns
+# how many schedules were written.
+def write_schedules(filename, file_format, tasks, starts_iter):
+    if file_format == "jsonl":
+        return write_jsonl(filename, tasks, starts_iter)
+    elif file_format == "binary":
+        return write_binary(filename, tasks, starts_iter)
+    else:
+        raise ValueError("Unknown export format.")
+
+# Each line is one schedule as a JSON object with its number and the [name, start hour] of every flexible task.
+def write_jsonl(filename, tasks, starts_iter):
+    names = [task.name for task in tasks]
+    count = 0
+    with open(filename, 'w') as file:
+        for starts in starts_iter:
+            count += 1
+            file.write(json.dumps({"schedule": count, "placements": [list(pair) for pair in zip(names, starts)]}))
+            file.write("\n")
+    return count
+
+def write_binary(filename, tasks, starts_iter):
+    count = 0
+    with open(filename, 'wb') as file:
+        file.write(BINARY_MAGIC + struct.pack("<BH", BINARY_VERSION, len(tasks)))
+        for task in tasks:
+            name = task.name.encode("utf-8")
+            file.write(struct.pack("<HH", task.duration, len(name)) + name)
+        if not tasks:
+            count = sum(1 for _ in starts_iter)
+            file.write(struct.pack("<Q", count))
+            return count
+        buffer = array('H')
+        for starts in starts_iter:
+            count += 1
+            buffer.extend(starts)
+            if len(buffer) >= BINARY_BUFFER_SIZE:
+                write_array(file, buffer)
+                buffer = array('H')
+        write_array(file, buffer)
+    return count
+
+# array writes in the machine's byte order, so swap it to little-endian first if needed.
+def write_array(file, buffer):
+    if struct.pack("=H", 1) != struct.pack("<H", 1):
+        buffer.byteswap()
+    buffer.tofile(file)
+
+# Reads a binary export back. Returns the list of (name, duration) for the tasks and a generator of the tuples of
+# start hours, which reads the file a chunk at a time.
+def read_binary(filename):
+    file = open(filename, 'rb')
+    if file.read(4) != BINARY_MAGIC:
+        file.close()
+        raise ValueError("Not a schedule export file.")
+    version, num_tasks = struct.unpack("<BH", file.read(3))
+    if version != BINARY_VERSION:
+        file.close()
+        raise ValueError("Unsupported schedule export version.")
+    tasks = []
+    for _ in range(num_tasks):
+        duration, name_length = struct.unpack("<HH", file.read(4))
+        tasks.append((file.read(name_length).decode("utf-8"), duration))
+    return tasks, read_records(file, num_tasks)
+
+def read_records(file, num_tasks):
+    with file:
+        if num_tasks == 0:
+            # the schedules have empty records, only their number is written
+            data = file.read(8)
+            count = struct.unpack("<Q", data)[0] if len(data) == 8 else 0
+            for _ in range(count):
+                yield ()
+            return
+        record_bytes = 2 * num_tasks
+        while True:
+            chunk = file.read(record_bytes * 4096)
+            if not chunk:
+                return
+            values = array('H')
+            values.frombytes(chunk)
+            if struct.pack("=H", 1) != struct.pack("<H", 1):
+                values.byteswap()
+            for i in range(0, len(values), num_tasks):
+                yield tuple(values[i:i + num_tasks])
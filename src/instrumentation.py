@@ -0,0 +1,94 @@
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+# Logger for the scheduling search. The search checks once per run whether debug logging is on for it, and only then
+# builds the per-node messages, so tracing costs nothing when it is off. Turn it on with for example
+# logging.basicConfig() and logging.getLogger("scheduler.search").setLevel(logging.DEBUG).
+logger = logging.getLogger("scheduler.search")
+
+def tracing_enabled():
+    return logger.isEnabledFor(logging.DEBUG)
+
+# Counters for one run of the search, the Scheduler keeps the ones for its last run in scheduler.stats.
+class SearchStats:
+    FIELDS = ("nodes", "slots_probed", "placements", "undos", "results")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # nodes of the search tree expanded
+        self.nodes = 0
+        # candidate start hours the strategy returned over all the nodes
+        self.slots_probed = 0
+        # tasks placed on and removed from the working week
+        self.placements = 0
+        self.undos = 0
+        # complete schedules found
+        self.results = 0
+
+    # Adds the counts of another SearchStats, used to merge the counts from worker processes.
+    def add(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return "SearchStats(" + ", ".join(field + "=" + str(getattr(self, field)) for field in self.FIELDS) + ")"
+
+# Timings for one profiled calculation (see Scheduler.profile_calculation), split into phases. Each phase keeps its
+# total seconds and how many times it ran. Phases can run inside each other, the search phase for example includes the
+# slot search, placement and capacity check phases that happen during it.
+class Profile:
+    def __init__(self):
+        self.phases = {}
+        # peak memory traced by tracemalloc during the calculation, and the memory the results kept take up
+        self.peak_bytes = 0
+        self.result_bytes = 0
+        self.results = 0
+        # slot lists the search found in its slot cache instead of asking the strategy
+        self.cache_hits = 0
+
+    def add(self, name, seconds, calls=1):
+        phase = self.phases.setdefault(name, [0.0, 0])
+        phase[0] += seconds
+        phase[1] += calls
+
+    def seconds(self, name):
+        return self.phases.get(name, [0.0, 0])[0]
+
+    # Times a block of code as one run of a phase:
+    #     with profile.phase("rendering"):
+    #         ...
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    # Returns a function that calls function and times every call as a run of the phase.
+    def timed(self, name, function):
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name, perf_counter() - start)
+        return timed_function
+
+    # Returns the breakdown as lines of text, with the per call time for each phase.
+    def report(self):
+        lines = ["Profile of the calculation:"]
+        for name, (seconds, calls) in self.phases.items():
+            per_call = seconds / calls * 1e6 if calls else 0.0
+            lines.append("  %-40s %10.4fs  %9d calls  %10.2fus per call" % (name, seconds, calls, per_call))
+        lines.append("  %-40s %10d hits" % ("slot cache", self.cache_hits))
+        lines.append("  %-40s %10d bytes" % ("peak memory", self.peak_bytes))
+        per_result = self.result_bytes / self.results if self.results else 0.0
+        lines.append("  %-40s %10d results  %10.1f bytes per result" % ("results kept", self.results, per_result))
+        return "\n".join(lines)
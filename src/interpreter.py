@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from fractions import Fraction
+from task import days_mask
 
 # The interpreter class has the parse method which all must implement. The parse method returns the parameters that
 # were parsed from user input.
@@ -7,6 +9,19 @@ class Interpreter(ABC):
     def parse(self, input_str):
         raise NotImplementedError
 
+# Converts a time or duration in hours to a number of slots of slot_minutes each. It can be a whole number of hours
+# like 9, a decimal like 9.5, or hours and minutes like 9:30. Raises ValueError if it is not a whole number of slots,
+# so with hour slots only whole hours are taken, like before.
+def hours_to_slots(text, slot_minutes=60):
+    if ":" in text:
+        hours, _, minutes = text.partition(":")
+        total_minutes = int(hours) * 60 + int(minutes)
+    else:
+        total_minutes = Fraction(text) * 60
+    if total_minutes % slot_minutes != 0:
+        raise ValueError(text + " is not a whole number of " + str(slot_minutes) + " minute slots")
+    return int(total_minutes // slot_minutes)
+
 # Command parser will return the string 'command' and the name of the command
 class CommandParser(Interpreter):
     def parse(self, input_str):
@@ -15,58 +30,59 @@ class CommandParser(Interpreter):
         return task_type, name, None, None, None
         
 
-# Flexible task parser will return the name and duration, and 'flexible' as task_type
+# Flexible task parser will return the name and duration, and 'flexible' as task_type. The duration is given in
+# hours and returned in slots of slot_minutes.
 class FlexibleTaskParser(Interpreter):
+    def __init__(self, slot_minutes=60):
+        self.slot_minutes = slot_minutes
+
     def parse(self, input_str): 
         # Expected format: "fixed|flexible TaskName 1 Day(s) [14]" for fixed tasks
         parts = input_str.split()
         task_type = "flexible"
         name = parts[1]
-        duration = int(parts[2])
+        duration = hours_to_slots(parts[2], self.slot_minutes)
         return task_type, name, duration, None, None
 
 # FixedTaskParser will return 'fixed' as task_type, name, duration, days_of_week, and start_time. Start_time is
-# hour of day the task starts, so 9 for 9 AM. Days of week is an array of 7 for each of the days and true if
-# the task is for that day and false if not. So if some fixed task is MTWRF then the days_of_week will be
-# [True, True, True, True, True, False, False].
+# hour of day the task starts, so 9 for 9 AM. Days of week is a 7-bit mask with a bit for each of the days, set if
+# the task is for that day, Monday in the lowest bit. So if some fixed task is MTWRF then the days_of_week will be
+# 0b0011111. With slot_minutes the duration and start time can be given as 9:30 or 9.5 and are returned in slots, so
+# 38 for 9:30 with 15 minute slots.
 class FixedTaskParser(Interpreter):
+    def __init__(self, slot_minutes=60):
+        self.slot_minutes = slot_minutes
+
     def parse(self, input_str):
         # Expected format: "fixed|flexible TaskName 1 Day(s) [14]" for fixed tasks
         parts = input_str.split()
         task_type = "fixed"
         name = parts[1]
-        duration = int(parts[2])       
+        duration = hours_to_slots(parts[2], self.slot_minutes)
         days = parts[3]
-        start_time = int(parts[4]) if task_type == "fixed" else None
-        days_of_week = []
-        # True for what day of week has it so if MTF, it will be [true, true, false, false, true, false, false]
-        if ('M' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('T' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('W' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('R' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('F' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('S' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
-        if ('U' in days):
-            days_of_week.append(True)
-        else:
-            days_of_week.append(False)
+        start_time = hours_to_slots(parts[4], self.slot_minutes) if task_type == "fixed" else None
+        # bit 0 is Monday up to bit 6 for Sunday, so MTF is 0b0010011
+        days_of_week = days_mask(days)
 
         return task_type, name, duration, start_time, days_of_week
+
+# CalculateParser reads the calculate command, which can be followed by limits for the search like
+# 'calculate max_results=100 timeout=5 max_nodes=1000000'. parse returns 'command' and 'calculate' like
+# CommandParser does, and parse_limits returns the limits as a dictionary of keyword arguments for
+# generate_flexible_schedules.
+class CalculateParser(Interpreter):
+    LIMITS = {"max_results": int, "timeout": float, "max_nodes": int}
+
+    def parse(self, input_str):
+        return "command", "calculate", None, None, None
+
+    def parse_limits(self, input_str):
+        limits = {}
+        for part in input_str.split()[1:]:
+            key, _, value = part.partition("=")
+            if key not in self.LIMITS or not value:
+                raise ValueError("Unknown limit " + part + ", use max_results=N, timeout=SECONDS or max_nodes=N")
+            limits[key] = self.LIMITS[key](value)
+            if limits[key] < 0:
+                raise ValueError("Limits cannot be negative")
+        return limits
@@ -1,50 +1,192 @@
-from interpreter import Interpreter, CommandParser, FlexibleTaskParser, FixedTaskParser
+from interpreter import Interpreter, CommandParser, FlexibleTaskParser, FixedTaskParser, CalculateParser
 from scheduler import ScheduleCommand, Scheduler, AddTaskCommand
 from task import TaskFactory
 from threading import Thread
 from strategy import SchedulingStrategy, EarliestSlotStrategy, SingleTaskPerDayAndStartAt9Strategy
+from store import ScheduleStore
+import argparse
 import sys
 
+# Reads the options the app is started with.
+def parse_options(argv):
+    parser = argparse.ArgumentParser(description="Schedule flexible tasks around fixed ones.")
+    parser.add_argument("--profile", action="store_true", help="print where the time of each calculate goes")
+    parser.add_argument("--slot-minutes", type=int, default=60, help="length of a slot, 60, 30, 15 or 5 minutes")
+    parser.add_argument("--weeks", type=int, default=1, help="how many weeks long the schedules are")
+    parser.add_argument("--cache", help="file to keep calculated schedules in between runs")
+    parser.add_argument("--cache-mb", type=int, default=256, help="largest size of the cache file's schedules in MB")
+    return parser.parse_args(argv)
+
+# The state of one run of the command line app that the commands share: the scheduler, the iterator the schedules
+# are pulled from one at a time on 'next schedule' (so only the one currently shown is kept in memory), the schedule
+# shown last and how many were shown, and the add commands executed so far so 'undo' can take back the last one.
+class Session:
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.schedule_iterator = iter(())
+        self.current_schedule = None
+        self.shown = 0
+        self.history = []
+
+# Now do the calculation of fitting it in schedule, schedule_iterator lazily yields all the flexible schedule
+# possiblities. With limits the schedules are found up front.
+def calculate_command(session, interpreter, user_input):
+    schedule = session.schedule
+    try:
+        limits = interpreter.parse_limits(user_input)
+    except ValueError as error:
+        print(str(error))
+        return
+    if limits:
+        # a bounded search finds the schedules up front and stops at the first limit it reaches
+        schedule.generate_fixed_schedule()
+        results = schedule.generate_flexible_schedules(**limits)
+        if schedule.truncated:
+            print("The search stopped at a limit, only the first " + str(len(results)) + " schedules were found")
+        session.schedule_iterator = iter(results)
+    elif schedule.profile:
+        # profiling runs the whole calculation up front so every phase can be timed
+        results, profile_report = schedule.profile_calculation()
+        print(profile_report.report())
+        session.schedule_iterator = iter(results)
+    else:
+        # builds on the last calculation when tasks were only added or undone since
+        session.schedule_iterator = schedule.iter_calculation()
+    session.current_schedule = None
+    session.shown = 0
+    print("Type next schedule to keep getting the different combinations of schedules that are possible")
+
+# Counts the flexible schedule possibilities without generating them.
+def count_command(session, interpreter, user_input):
+    session.schedule.generate_fixed_schedule()
+    print("There are " + str(session.schedule.count_flexible_schedules()) + " possible schedules")
+
+# Prints the next schedule of the last calculation, or the fixed schedule if there are none.
+def next_schedule_command(session, interpreter, user_input):
+    next_schedule = next(session.schedule_iterator, None)
+    if next_schedule is None and session.shown == 0:
+        print("Only fixed tasks provided OR not enough time for any of the flexible tasks, "
+              "printing out the fixed schedule.")
+        print(session.schedule.week.print_day_tasks())
+        print("Completed showing schedule, 'next schedule' will print out same one")
+        print("If you would like to save this schedule, enter 'save'")
+    elif next_schedule is None:
+        print("End of schedule combinations. Try adding more tasks and calculate again "
+              "or enter 'calculate' to get the list again.")
+    else:
+        # Move on to the next schedule type.
+        session.current_schedule = next_schedule
+        session.shown = session.shown + 1
+        print("-------------------------------------Schedule-------------------------------------------------")
+        print(next_schedule.print_day_tasks())
+        print("Completed showing schedule, enter 'next schedule' for the next combination, it will print out if it exists")
+        print("If you would like to save this schedule, enter 'save'")
+
+# Streams every schedule to a file in the format asked for.
+def export_command(session, interpreter, user_input):
+    print("Please provide file name to export all the schedules to")
+    filename = input()
+    print("Please provide the format, jsonl or binary")
+    file_format = input().strip()
+    session.schedule.generate_fixed_schedule()
+    try:
+        count = session.schedule.export_flexible_schedules(filename, file_format)
+        print("Exported " + str(count) + " schedules successfully")
+    except ValueError as error:
+        print(str(error))
+
+# Takes back the last task added.
+def undo_command(session, interpreter, user_input):
+    if session.history:
+        session.history.pop().undo()
+        print("Enter 'calculate' to get the schedules without that task")
+    else:
+        print("Nothing to undo")
+
+# Saves the schedule shown last to a file. If no flexible schedule has been shown yet, the fixed schedule is what is
+# saved.
+def save_command(session, interpreter, user_input):
+    print("Please provide file name to save schedule to")
+    filename = input()
+    if session.current_schedule is not None:
+        text = session.current_schedule.print_day_tasks()
+    else:
+        text = session.schedule.week.print_day_tasks()
+    with open(filename, 'w') as file:
+        file.write(text)
+    print("Saved schedule successfully")
+
+# The function that runs each command, by its name.
+COMMANDS = {
+    "calculate": calculate_command,
+    "count": count_command,
+    "next schedule": next_schedule_command,
+    "export": export_command,
+    "undo": undo_command,
+    "save": save_command,
+}
+
+# Prints how to use the app.
+def print_instructions(slot_minutes):
+    print("Starting week scheduler. Please add all the fixed time obligations and then flexible ones.")
+    print("This app will schedule the flexible ones around the fixed ones and provide all the different combinations.")
+    print("If you would like a certain time blocked just add a fixed time obligation to it that means "
+          "\"a break\" or something.")
+    print("After you are ready to calculate the schedule, type \"calculate\"")
+    print("To stop a long search early add limits, for example \"calculate max_results=100 timeout=5 max_nodes=1000000\"")
+    print("To see how many schedules are possible without going through them, type \"count\"")
+    print("To write every possible schedule to a file, type \"export\"")
+    print("To take back the last task you added, type \"undo\"")
+    print("Keep granuality of " + str(slot_minutes) + " minutes. Sunday is U, Thursday is R and format for command is")
+    print("'fixed TaskName 1 Day(s) [14]' for fixed tasks so type name time in hr which days start time if fixed")
+    print("Times can also be given with minutes like 9:30 or 1.5 if they are whole slots")
+    print("For flexible do flexible TaskName 1 because it just needs time and they don't repeat they are one time things")
+    #print(" This will generate up to 20 possible schedules max (if possible)")
+    print("First please enter the scheduling strategy: "
+          "1 for EarliestSlotStrategy and 2 for SingleTaskPerDayAndStartAt9Strategy")
+
 # Main method, this deals with the CLI interface. 
 # The first choice is of the strategy, using the strategy pattern a selected strategy is then passed on to
 # the Scheduler class. A while loop allows the
 # user to keep entering commands. We then use the interpreter pattern to take in user commands. Either we 
 # have a task or a command. For the task we use the factory method to create the task. And then the 
 # command pattern to add it (as of now we have adding but this allows for further extensibilty later). 
-# If we have a command then depending on the name we complete different actions.
+# If we have a command then depending on the name its function in COMMANDS is run.
+# Run it with --profile to print a breakdown of where the time and memory of each calculate goes, --slot-minutes 15
+# to schedule in quarter hours, and --weeks 2 to schedule two weeks at a time. With --cache schedules.db the schedules
+# of each calculate are kept in that file, and calculating the same tasks again, even after a restart, reads them
+# back or carries on from where the last one stopped.
 def main():
-    print("Starting week scheduler. Please add all the fixed time obligations and then flexible ones.")
-    print("This app will schedule the flexible ones around the fixed ones and provide all the different combinations.")
-    print("If you would like a certain time blocked just add a fixed time obligation to it that means \"a break\" or something.")
-    print("After you are ready to calculate the schedule, type \"calculate\"")
-    print("Keep granuality of an hour. Sunday is U, Thursday is R and format for command is")
-    print("'fixed TaskName 1 Day(s) [14]' for fixed tasks so type name time in hr which days start time if fixed")
-    print("For flexible do flexible TaskName 1 because it just needs time and they don't repeat they are one time things")
-    #print(" This will generate up to 20 possible schedules max (if possible)")
-    print("First please enter the scheduling strategy: 1 for EarliestSlotStrategy and 2 for SingleTaskPerDayAndStartAt9Strategy")
+    options = parse_options(sys.argv[1:])
+    profile = options.profile
+    store = ScheduleStore(options.cache, options.cache_mb * 1024 * 1024) if options.cache else None
+    print_instructions(options.slot_minutes)
     int_input = int(input())
     # The first choice is of the strategy, using the strategy pattern a selected strategy is then passed on to
     # the Scheduler class.
     if int_input == 1:
-        schedule = Scheduler(EarliestSlotStrategy())
+        schedule = Scheduler(EarliestSlotStrategy(options.slot_minutes), profile=profile, weeks=options.weeks,
+                             store=store)
     elif int_input == 2:
-        schedule = Scheduler(SingleTaskPerDayAndStartAt9Strategy())
+        schedule = Scheduler(SingleTaskPerDayAndStartAt9Strategy(options.slot_minutes), profile=profile,
+                             weeks=options.weeks, store=store)
     else:
         print("Invalid strategy, exiting")
         return
     
     print("Now enter tasks")
     user_input = input()
-    index = 0
-    list_of_schedules = []
+    session = Session(schedule)
     
     while (True):
         interpreter = None
         #task_type, name, duration, start_time, days_of_week = TaskParser.parse(input_str = user_input)
         if (user_input.startswith("flexible")):
-            interpreter = FlexibleTaskParser()
+            interpreter = FlexibleTaskParser(options.slot_minutes)
         elif (user_input.startswith("fixed")):
-            interpreter = FixedTaskParser()
+            interpreter = FixedTaskParser(options.slot_minutes)
+        elif (user_input.split()[:1] == ["calculate"]):
+            interpreter = CalculateParser()
         else:
             interpreter = CommandParser()
         task_type, name, duration, start_time, days_of_week = interpreter.parse(user_input)
@@ -52,42 +194,12 @@ def main():
             task = TaskFactory.create_task(task_type, name, duration, days_of_week, start_time)
             add = AddTaskCommand(schedule, task)
             add.execute()
+            session.history.append(add)
             print("Next task ---")
+        elif name in COMMANDS:
+            COMMANDS[name](session, interpreter, user_input)
         else:
-            if name == "calculate":
-                # now do the calculation of fitting it in schedule, list_of_schedules has all the flexible schedule possiblities.
-                schedule.generate_fixed_schedule()
-                list_of_schedules = schedule.generate_flexible_schedules()
-                print(list_of_schedules)
-                print("Type next schedule to keep getting the different combinations of schedules that are possible")
-                index = -1
-            elif name == "next schedule":
-                if len(list_of_schedules) == 0:
-                    print("Only fixed tasks provided OR not enough time for any of the flexible tasks, printing out the fixed schedule.")
-                    print(schedule.week.print_day_tasks())
-                    print("Completed showing schedule, 'next schedule' will print out same one")
-                    print("If you would like to save this schedule, enter 'save'")
-                elif (index+1 > len(list_of_schedules)):
-                    print("End of schedule combinations. Try adding more tasks and calculate again or enter 'calculate' to get the list again.")
-                else:
-                    # Change index for the next schedule type. 
-                    index = index + 1
-                    if (index > len(list_of_schedules)):
-                        print("End of schedule combinations. Try adding more tasks and calculate again or enter 'calculate' to get the list again.")
-                    else:
-                        print("-------------------------------------Schedule-------------------------------------------------")
-                        print(list_of_schedules[index].week.print_day_tasks())
-                        print("Completed showing schedule, enter 'next schedule' for the next combination, it will print out if it exists") 
-                        print("If you would like to save this schedule, enter 'save'")
-            elif name == "save":
-                print("Please provide file name to save schedule to")
-                filename = input()
-                with open(filename, 'w') as file:
-                    file.write(list_of_schedules[index].week.print_day_tasks())
-                print("Saved schedule successfully")
-                    
-            else:
-                print("Invalid command entered, please try again.")
+            print("Invalid command entered, please try again.")
         user_input = input()
               
     
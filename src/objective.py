@@ -0,0 +1,45 @@
+from abc import ABC, abstractmethod
+
+# This class is the interface for the scoring hook used to rank schedules, like SchedulingStrategy each objective
+# is its own class so new ones can be added without changing the Scheduler. A lower score is a better schedule.
+# score gets the week with the flexible tasks placed, the flexible tasks, and their start hours.
+class Objective(ABC):
+    @abstractmethod
+    def score(self, week, tasks, starts):
+        raise NotImplementedError
+
+    # Returns a lower bound on the score of every schedule that can be finished from a partly placed week, where
+    # starts only has the start hours of the tasks placed so far. The default is the score of the partial week,
+    # which is a valid bound for objectives that can only get worse as more tasks are placed (all the ones here).
+    # Objectives that can improve as tasks are added must override this with a looser bound.
+    def bound(self, week, tasks, starts):
+        return self.score(week, tasks, starts)
+
+# Prefers schedules where the flexible tasks are all done as early in the week as possible, the score is the hour
+# the last one finishes.
+class EarliestFinishObjective(Objective):
+    def score(self, week, tasks, starts):
+        finish = 0
+        for task, start_hour in zip(tasks, starts):
+            finish = max(finish, start_hour + task.duration)
+        return finish
+
+# Prefers schedules that switch between different tasks the fewest times, the score counts the pairs of back to back
+# hours that both have a task in them but not the same one. Placing a task never removes such a pair.
+class FewestContextSwitchesObjective(Objective):
+    def score(self, week, tasks, starts):
+        sched = week.twentyfour_hr_sched
+        switches = 0
+        for hour in range(1, len(sched)):
+            if sched[hour] is not None and sched[hour - 1] is not None and sched[hour] is not sched[hour - 1]:
+                switches += 1
+        return switches
+
+# Prefers schedules that leave the longest block of free time, the score is minus the length of the longest free run.
+# Placing a task can only make the free runs shorter.
+class MostContiguousFreeTimeObjective(Objective):
+    def score(self, week, tasks, starts):
+        longest = 0
+        for run_start, run_end in week.free_runs:
+            longest = max(longest, run_end - run_start)
+        return -longest
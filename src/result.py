@@ -0,0 +1,99 @@
+from array import array
+from week import WeekRenderer
+
+# The layout every result of one calculation shares: the week with only the fixed tasks placed, the flexible tasks in
+# the order the search placed them, and all the tasks of the scheduler. It is made once per calculation, so each
+# result only has to keep its own start hours.
+class ScheduleLayout:
+    def __init__(self, fixed_week, flex_tasks, tasks):
+        self.fixed_week = fixed_week
+        self.flex_tasks = tuple(flex_tasks)
+        self.tasks = list(tasks)
+        self.renderer = None
+
+    # The renderer for the fixed week, made the first time a schedule is rendered and then shared by all of them.
+    def get_renderer(self):
+        if self.renderer is None:
+            self.renderer = WeekRenderer(self.fixed_week)
+        return self.renderer
+
+    # Renders many results of this layout in one call.
+    def render_many(self, results):
+        return self.get_renderer().render_many(result.placements() for result in results)
+
+# A compact schedule result: the shared layout plus the start hour of each flexible task in an array of unsigned
+# shorts, a few bytes per task. The Week is only built when the schedule is actually shown or saved, through the week
+# property, so millions of results can be kept in memory. It can be used like the Scheduler results used to be,
+# result.week.print_day_tasks() still works.
+class ScheduleResult:
+    __slots__ = ("layout", "starts")
+
+    def __init__(self, layout, starts):
+        self.layout = layout
+        self.starts = array('H', starts)
+
+    @property
+    def tasks(self):
+        return self.layout.tasks
+
+    # Builds the Week for this schedule by placing the flexible tasks on a copy of the fixed week.
+    @property
+    def week(self):
+        week = self.layout.fixed_week.copy()
+        for task, start_hour in zip(self.layout.flex_tasks, self.starts):
+            week.place_task(task, start_hour)
+        return week
+
+    # Returns the (task, start hour) pairs of the flexible tasks.
+    def placements(self):
+        return list(zip(self.layout.flex_tasks, self.starts))
+
+    # Renders the schedule from the layout's cached fixed week lines without building the Week.
+    def print_day_tasks(self):
+        return self.layout.get_renderer().render(self.placements())
+
+# The results of one calculation of a Scheduler, for the tasks it had at the time. The results are pulled from source
+# as they are needed and remembered, so the calculation can be gone through again, or another one built on top of it,
+# without searching again. Every iteration starts from the first result. With max_kept only that many results are
+# remembered: once there are more the remembered ones are let go and the rest are only passed on to the iteration that
+# pulled them, and the calculation is forgotten so it is not used again.
+class CalculationResults:
+    def __init__(self, tasks, source, max_kept=None):
+        self.tasks = tuple(tasks)
+        self.results = []
+        self.source = source
+        self.max_kept = max_kept
+        # set when the source raised, for example when the search was cancelled, so the results are only some of them
+        self.failed = False
+        # set when there were more than max_kept results, so they are not all remembered
+        self.forgotten = False
+
+    # Whether every result has been found already.
+    def is_complete(self):
+        return self.source is None and not self.failed and not self.forgotten
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self.results):
+                yield self.results[i]
+                i += 1
+            elif self.source is None:
+                return
+            else:
+                try:
+                    result = next(self.source, None)
+                except BaseException:
+                    self.source = None
+                    self.failed = True
+                    raise
+                if result is None:
+                    self.source = None
+                    return
+                if self.max_kept is not None and len(self.results) >= self.max_kept:
+                    self.results = []
+                    self.forgotten = True
+                if self.forgotten:
+                    yield result
+                else:
+                    self.results.append(result)
@@ -1,7 +1,16 @@
 from datetime import timedelta
 from task import Task, FixedTask, FlexibleTask
 from week import Week
-from copy import deepcopy
+from math import factorial
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+from export import write_schedules
+from result import ScheduleLayout, ScheduleResult, CalculationResults
+from cache import LRUCache
+from store import calculation_key
+from instrumentation import SearchStats, Profile, logger, tracing_enabled
+import tracemalloc
+from time import perf_counter
 
 # This is the use of the command pattern, each class that implements it needs an execute method.
 class ScheduleCommand:
@@ -20,64 +29,592 @@ class AddTaskCommand(ScheduleCommand):
     def undo(self):
         self.schedule.remove_task(self.task)
 
+# Raised out of a search that was stopped with Scheduler.cancel.
+class SearchCancelled(Exception):
+    pass
+
+# Raised out of a search that ran into its max_nodes or timeout limit, generate_flexible_schedules catches it.
+class SearchTruncated(Exception):
+    pass
+
 # The scheduler class holds each potential schedule.
 class Scheduler:
-    # Init method takes in a strategy to initiate the Week object with.
-    def __init__(self, strategy):
+    # Init method takes in a strategy to initiate the Week object with. With profile on, the apps run each calculation
+    # through profile_calculation and print where its time went. cache_size is how many slot lists and feasibility
+    # answers the search remembers (see backtrack), 0 turns the caches off. With verbose off nothing is printed when
+    # tasks are added or removed, for batch runs. weeks is how many weeks long the schedules are, the fixed tasks
+    # happen on their days in every one of them. store is an optional ScheduleStore that calculations are saved to and
+    # loaded from, so they are kept when the app is restarted.
+    def __init__(self, strategy, profile=False, cache_size=4096, verbose=True, weeks=1, store=None):
         self.tasks = []
-        self.week = Week(strategy)
+        self.profile = profile
+        self.verbose = verbose
+        self.store = store
+        self.cache_size = cache_size
+        # slot lists by (occupancy, duration), they only depend on which hours are taken so they stay valid for as
+        # long as the strategy is the same
+        self.slot_cache = LRUCache(cache_size)
+        self.week = Week(strategy, weeks)
+        # counters for the last search run (see instrumentation.py), and whether it is logging every node
+        self.stats = SearchStats()
+        self.trace = False
+        # the latest calculations, oldest first, that calculate can start from (see iter_calculation)
+        self.calculations = []
+        # set by cancel, possibly from another thread, to stop the running search
+        self.cancelled = False
+        # the limits of the running search and the node count at which they are checked next (see check_limits)
+        self.clear_limits()
+        # whether the last generate_flexible_schedules stopped at a limit before it found every schedule
+        self.truncated = False
 
     # add_task adds a task to the tasks array.
     def add_task(self, task):
         self.tasks.append(task)
-        print(f"Task added: {task.name}")
+        if self.verbose:
+            print(f"Task added: {task.name}")
 
-    # removed removes a task from the tasks array
+    # removed removes a task from the tasks array, and drops the calculations that had it so that the next calculate
+    # goes back to the one from before it was added. Equal tasks are the same object (see task.py), so the one added
+    # last is the one removed.
     def remove_task(self, task):
-        self.tasks.remove(task)
-        print(f"Task removed: {task.name}")
+        del self.tasks[len(self.tasks) - 1 - self.tasks[::-1].index(task)]
+        self.calculations = [calculation for calculation in self.calculations
+                             if self.starts_with(calculation.tasks)]
+        if self.verbose:
+            print(f"Task removed: {task.name}")
     
+    # Stops the search that is running, it raises SearchCancelled at the next node. This is safe to call from
+    # another thread than the one running the search, the next search starts with it cleared again.
+    def cancel(self):
+        self.cancelled = True
+        self.next_check = 0
+
+    # How many nodes the search expands between checks of the timeout.
+    CHECK_INTERVAL = 1024
+
+    # Removes the limits and cancel, so the search runs until it is done.
+    def clear_limits(self):
+        self.cancelled = False
+        self.max_nodes = None
+        self.deadline = None
+        self.next_check = float("inf")
+
+    # Sets the limits for the search that is about to run: it stops after max_nodes nodes or timeout seconds.
+    def set_limits(self, max_nodes=None, timeout=None):
+        self.max_nodes = max_nodes
+        self.deadline = perf_counter() + timeout if timeout is not None else None
+        self.next_check = 0
+
+    # backtrack calls this whenever the node count reaches next_check, so a search without limits only pays for one
+    # comparison per node. It raises if the search has to stop, and otherwise works out when to check next.
+    def check_limits(self):
+        if self.cancelled:
+            raise SearchCancelled()
+        nodes = self.stats.nodes
+        if self.max_nodes is not None and nodes >= self.max_nodes:
+            raise SearchTruncated()
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            raise SearchTruncated()
+        if self.deadline is not None:
+            self.next_check = nodes + self.CHECK_INTERVAL
+        else:
+            self.next_check = float("inf")
+        if self.max_nodes is not None:
+            self.next_check = min(self.next_check, self.max_nodes)
+
     # This method executes the inputted command.
     def execute_command(self, command):
         command.execute()
     
-    # This method places the fixed tasks where they are supposed to be in the week object.
+    # This method places the fixed tasks where they are supposed to be in the week object. It starts from an empty
+    # week every time, so calling it again, or after a fixed task was removed, gives the same week.
     def generate_fixed_schedule(self):
         #main logic of how this will work
         # first we will assign all the fixed tasks.
+        self.week = Week(self.week.strategy, self.week.weeks)
+        slots_per_day = self.week.slots_per_day
         for i in self.tasks:
             if isinstance(i, FixedTask):
-                for j in range(7):
-                    if i.days_of_week[j]:
-                        self.week.place_task(i, j*24 + i.start_time)
-
-    # This method generates the possible differnet flexible schedule combinations. It takes a task and places
-    # it and then backtracks the remianing tasks.
-    def backtrack(self, remaining_tasks, current_schedule, results):
-        if not remaining_tasks:  # All tasks placed
-            results.append(deepcopy(current_schedule))
+                for week_index in range(self.week.weeks):
+                    for j in range(7):
+                        if i.on_day(j):
+                            self.week.place_task(i, (week_index*7 + j)*slots_per_day + i.start_time)
+
+    # Uses a week that already has the fixed tasks of this scheduler placed instead of calling generate_fixed_schedule,
+    # and a slot cache shared with other schedulers if one is given. Schedulers with the same strategy and the same
+    # fixed tasks can share both: the searches only work on copies of the week, and the cached slot lists only
+    # depend on which slots are taken.
+    def use_fixed_week(self, week, slot_cache=None):
+        self.week = week
+        if slot_cache is not None:
+            self.slot_cache = slot_cache
+
+    # This method generates the possible differnet flexible schedule combinations. It takes the next task and
+    # places it on the shared working week, backtracks the remianing tasks, and then undoes the placement so the
+    # next slot can be tried. starts holds the start hour of every task placed so far. It is a generator, so each
+    # finished placement is yielded as a tuple of start hours as soon as it is found, while the working week still
+    # holds it. If prune is given it is called with the week and starts at every node, and the node's whole subtree
+    # is skipped when it returns True.
+    def backtrack(self, tasks, week, starts, twins=None, prune=None):
+        stats = self.stats
+        if stats.nodes >= self.next_check:
+            self.check_limits()
+        if prune is not None and prune(week, starts):
+            return
+        stats.nodes += 1
+        if len(starts) == len(tasks):  # All tasks placed
+            stats.results += 1
+            if self.trace:
+                logger.debug("schedule found: %s", starts)
+            yield tuple(starts)
             return
 
-        task = remaining_tasks[0]
-        available_slots = current_schedule.week.get_available_slots(task.duration)
-        print(available_slots)
+        task = tasks[len(starts)]
+        # Different orders of placing tasks often end up with the same hours taken, so the slot lists are cached by
+        # the occupancy. The cached lists are shared and must not be changed.
+        slot_key = (week.occupancy, task.duration)
+        available_slots = self.slot_cache.get(slot_key)
+        if available_slots is None:
+            available_slots = week.get_available_slots(task.duration)
+            self.slot_cache.put(slot_key, available_slots)
+        stats.slots_probed += len(available_slots)
+        if self.trace:
+            logger.debug("depth %d, %s (%d hours): %d slots %s", len(starts), task.name, task.duration,
+                         len(available_slots), available_slots)
+
+        # With symmetry breaking, a task can only start after the interchangeable task placed before it, so each
+        # set of identical placements is only generated once.
+        twin = twins[len(starts)] if twins else None
+        if twin is not None:
+            available_slots = [start_hour for start_hour in available_slots if start_hour > starts[twin]]
 
         for start_hour in available_slots:
-            # Create a new schedule to try this placement
-            new_schedule = deepcopy(current_schedule)
-            new_schedule.week.place_task(task, start_hour)
-            self.backtrack(remaining_tasks[1:], new_schedule, results)
-    
-    # This method generates the flexible schedules by using the backtrack method. It returns a list of 
-    # objects of type Scheduler that can be exmained and printed as they have contained the different schedules.
-    def generate_flexible_schedules(self):
+            # Try this placement, then undo it before trying the next one
+            week.place_task(task, start_hour)
+            stats.placements += 1
+            starts.append(start_hour)
+            yield from self.backtrack(tasks, week, starts, twins, prune)
+            starts.pop()
+            week.remove_task(task, start_hour)
+            stats.undos += 1
+
+    # Yields the start hours of the schedules that come after the schedule after in the order backtrack finds them,
+    # without going through the ones before it again. It follows the placements of after down the search tree, and
+    # at every level searches the slots that come after the one it followed.
+    def backtrack_after(self, tasks, week, starts, after, prune=None):
+        if len(starts) == len(tasks):
+            # this is after itself
+            return
+        task = tasks[len(starts)]
+        available_slots = week.get_available_slots(task.duration)
+        position = available_slots.index(after[len(starts)])
+        for i in range(position, len(available_slots)):
+            start_hour = available_slots[i]
+            week.place_task(task, start_hour)
+            starts.append(start_hour)
+            if i == position:
+                yield from self.backtrack_after(tasks, week, starts, after, prune)
+            else:
+                yield from self.backtrack(tasks, week, starts, None, prune)
+            starts.pop()
+            week.remove_task(task, start_hour)
+
+    # This method makes the layout that all results of one calculation share (see result.py). It holds its own copy
+    # of the fixed week so the results do not change if more tasks are added to this scheduler later.
+    def make_layout(self, flex_tasks):
+        return ScheduleLayout(self.week.copy(), flex_tasks, self.tasks)
+
+    # Returns the flexible tasks in the order the search places them. By default that is the order they were added,
+    # with order "longest_first" the longest tasks go first and with order "fewest_slots" the tasks with the fewest
+    # available slots in the fixed week go first. Placing the most constrained tasks first makes dead ends show up
+    # near the top of the search tree instead of at the leaves.
+    def get_flexible_tasks(self, order=None):
         flex_tasks = []
-        results = []
         for i in self.tasks:
             if isinstance(i, FlexibleTask):
                 flex_tasks.append(i)
+        if order is None:
+            return flex_tasks
+        if order == "longest_first":
+            return sorted(flex_tasks, key=lambda task: -task.duration)
+        if order == "fewest_slots":
+            slots = self.week.strategy.get_available_slots_batch(self.week, [task.duration for task in flex_tasks])
+            return sorted(flex_tasks, key=lambda task: len(slots[task.duration]))
+        raise ValueError("Unknown task order.")
+
+    # For every task this finds the index of the last earlier task it is interchangeable with, or None. With
+    # symmetry "duration" tasks with the same duration are interchangeable, and with symmetry "name" they also
+    # need the same name.
+    @staticmethod
+    def find_twins(tasks, symmetry):
+        if symmetry is None:
+            return None
+        if symmetry == "duration":
+            keys = [task.duration for task in tasks]
+        elif symmetry == "name":
+            keys = [(task.name, task.duration) for task in tasks]
+        else:
+            raise ValueError("Unknown symmetry mode.")
+        last_seen = {}
+        twins = []
+        for i, key in enumerate(keys):
+            twins.append(last_seen.get(key))
+            last_seen[key] = i
+        return twins
+
+    # This method lazily generates the flexible schedules one at a time using the backtrack method. Only the
+    # schedule currently being looked at is kept in memory, so the first one is available right away no matter
+    # how many combinations there are. The search places tasks on a single working copy of the week, so the
+    # fixed schedule in self.week is never changed. If symmetry is "duration" or "name", interchangeable tasks
+    # are only placed in increasing start order so permutations of them are not repeated. See get_flexible_tasks for
+    # order and prepare_search for check_capacity.
+    def iter_flexible_schedules(self, symmetry=None, order=None, check_capacity=True):
+        flex_tasks, twins, prune = self.prepare_search(symmetry, order, check_capacity)
+        layout = self.make_layout(flex_tasks)
+        week = self.week.copy()
+        for starts in self.backtrack(flex_tasks, week, [], twins, prune):
+            yield ScheduleResult(layout, starts)
+
+    # Returns the flexible tasks in search order, their symmetry twins, and the prune callback for backtrack. With
+    # check_capacity the strategy's can_fit is asked at every node whether the tasks that are left can still fit in
+    # the week, so a branch that cannot be finished is dropped right away instead of at the leaves. can_fit only
+    # says no when no placement is possible, so this never changes the schedules that are found.
+    # It also starts a new run of the search counters in self.stats and clears cancel.
+    def prepare_search(self, symmetry=None, order=None, check_capacity=True):
+        self.stats = SearchStats()
+        self.clear_limits()
+        self.trace = tracing_enabled()
+        flex_tasks = self.get_flexible_tasks(order)
+        twins = self.find_twins(flex_tasks, symmetry)
+        if not check_capacity:
+            return flex_tasks, twins, None
+        strategy = self.week.strategy
+        remaining_durations = [[task.duration for task in flex_tasks[i:]] for i in range(len(flex_tasks) + 1)]
+        # whether the tasks that are left fit, by (occupancy, number of tasks placed), only for this run since the
+        # tasks that are left depend on the task order
+        fit_cache = LRUCache(self.cache_size)
+
+        last = len(flex_tasks)
+
+        def prune(week, starts):
+            if len(starts) == last:
+                # nothing is left to fit at a finished schedule
+                return False
+            fit_key = (week.occupancy, len(starts))
+            fits = fit_cache.get(fit_key)
+            if fits is None:
+                fits = strategy.can_fit(week, remaining_durations[len(starts)])
+                fit_cache.put(fit_key, fits)
+            return not fits
+
+        return flex_tasks, twins, prune
+
+    # Number of earlier calculations kept for iter_calculation to start from.
+    MAX_CALCULATIONS = 4
 
-        self.backtrack(flex_tasks, deepcopy(self), results)
+    # Whether the tasks, in order, are the first tasks of this scheduler.
+    def starts_with(self, tasks):
+        return len(tasks) <= len(self.tasks) and all(a is b for a, b in zip(tasks, self.tasks))
+
+    # This method places the fixed tasks and lazily generates every flexible schedule like iter_flexible_schedules
+    # does, but reuses the work of earlier calculations. If tasks were only added since one of the kept
+    # calculations, its schedules are taken again in order: a new fixed task only drops the ones it collides with,
+    # and new flexible tasks are only placed around the placements that are already there, which gives the same
+    # schedules in the same order as a search from scratch. With no changes, or after the added tasks were undone,
+    # the earlier schedules are returned as they are. A cancelled calculation is not reused. With max_kept the
+    # calculation only remembers that many schedules, one with more is not reused either (see CalculationResults).
+    def iter_calculation(self, max_kept=None):
+        self.clear_limits()
+        self.generate_fixed_schedule()
+        tasks = tuple(self.tasks)
+        # a calculation whose search was cancelled or failed partway only has some of its schedules
+        self.calculations = [calculation for calculation in self.calculations
+                             if not calculation.failed and not calculation.forgotten]
+        base = None
+        for calculation in reversed(self.calculations):
+            if self.starts_with(calculation.tasks):
+                base = calculation
+                break
+        if base is not None and len(base.tasks) == len(tasks):
+            return iter(base)
+
+        flex_tasks, twins, prune = self.prepare_search()
+        layout = self.make_layout(flex_tasks)
+        if base is None and self.store is not None:
+            found = self.stored_search(flex_tasks, prune)
+        elif base is None:
+            found = self.backtrack(flex_tasks, self.week.copy(), [], None, prune)
+        else:
+            fixed_added = any(isinstance(task, FixedTask) for task in tasks[len(base.tasks):])
+            found = self.extend_calculation(base, flex_tasks, fixed_added, prune)
+        calculation = CalculationResults(tasks, (ScheduleResult(layout, starts) for starts in found), max_kept)
+        self.calculations.append(calculation)
+        del self.calculations[:-self.MAX_CALCULATIONS]
+        return iter(calculation)
+
+    # How many schedules are saved to the store at once, and how long at most new schedules wait to be saved.
+    STORE_CHUNK = 4096
+    STORE_SECONDS = 1.0
+
+    # Yields the start hours of every schedule of a calculation from scratch through self.store. The schedules stored
+    # for the same strategy and tasks are read back first, and if that calculation was stopped before the end the
+    # search resumes right after the last of them. The schedules found are saved in chunks as they are found, and
+    # whatever is left when the search stops.
+    def stored_search(self, flex_tasks, prune):
+        store = self.store
+        key = calculation_key(self.week.strategy, self.week.weeks, self.tasks)
+        stored = store.lookup(key)
+        position = 0
+        last = None
+        if stored is not None:
+            for starts in store.iter_results(key):
+                position += 1
+                last = starts
+                yield starts
+            if stored[1] and position == stored[0]:
+                return
+        if last is None:
+            found = self.backtrack(flex_tasks, self.week.copy(), [], None, prune)
+        else:
+            found = self.backtrack_after(flex_tasks, self.week.copy(), [], last, prune)
+        pending = []
+        save_at = perf_counter() + self.STORE_SECONDS
+        try:
+            for starts in found:
+                pending.append(starts)
+                if len(pending) >= self.STORE_CHUNK or perf_counter() >= save_at:
+                    store.append(key, len(flex_tasks), position, pending)
+                    position += len(pending)
+                    pending = []
+                    save_at = perf_counter() + self.STORE_SECONDS
+                yield starts
+            store.append(key, len(flex_tasks), position, pending, complete=True)
+            pending = []
+        finally:
+            if pending:
+                store.append(key, len(flex_tasks), position, pending)
+
+    # Returns the list of every flexible schedule, see iter_calculation.
+    def calculate(self):
+        return list(self.iter_calculation())
+
+    # Goes through the schedules of an earlier calculation and yields the start hours of the schedules they lead
+    # to now. Each one's placements are put back on the fixed week, checked with the strategy first if fixed tasks
+    # were added, and the flexible tasks added since are then searched from there.
+    def extend_calculation(self, base, flex_tasks, fixed_added, prune):
+        week = self.week.copy()
+        strategy = week.strategy
+        for result in base:
+            placed = []
+            for task, start_hour in zip(flex_tasks, result.starts):
+                if fixed_added and not strategy.is_available(week, start_hour, task.duration):
+                    break
+                week.place_task(task, start_hour)
+                placed.append((task, start_hour))
+            else:
+                yield from self.backtrack(flex_tasks, week, list(result.starts), None, prune)
+            for task, start_hour in reversed(placed):
+                week.remove_task(task, start_hour)
+
+    # This method counts the flexible schedules without generating them, the strategy counts the placements on a
+    # copy of the fixed week. With symmetry breaking every set of k interchangeable tasks is only placed in one of
+    # its k! orders, so the count is divided by that.
+    def count_flexible_schedules(self, symmetry=None):
+        flex_tasks = self.get_flexible_tasks()
+        twins = self.find_twins(flex_tasks, symmetry)
+        total = self.week.strategy.count_schedules(self.week.copy(), flex_tasks)
+        if twins:
+            group_sizes = {}
+            for i, twin in enumerate(twins):
+                group_sizes[i] = 1 if twin is None else group_sizes.pop(twin) + 1
+            for size in group_sizes.values():
+                total //= factorial(size)
+        return total
+
+    # This method generates the flexible schedules by using the backtrack method. It returns a list of 
+    # ScheduleResult objects that can be exmained and printed as they have contained the different schedules.
+    # With workers greater than 1 the search tree is split up and searched in that many processes, the schedules
+    # come back in the same order as the serial search.
+    # The search can be bounded: it stops after max_results schedules, after max_nodes nodes of the search tree or
+    # after timeout seconds, and returns the schedules found until then. self.truncated says whether it stopped
+    # before it found all of them. A bounded search always runs in this process, so its results are the first ones
+    # of the serial order.
+    def generate_flexible_schedules(self, symmetry=None, workers=None, order=None, check_capacity=True,
+                                    max_results=None, timeout=None, max_nodes=None, mp_context=None):
+        self.truncated = False
+        if max_results is not None or timeout is not None or max_nodes is not None:
+            return self.generate_limited_schedules(symmetry, order, check_capacity, max_results, timeout, max_nodes)
+        if workers is not None and workers > 1:
+            return self.generate_flexible_schedules_parallel(symmetry, workers, order, check_capacity, mp_context)
+        return list(self.iter_flexible_schedules(symmetry, order, check_capacity))
+
+    def generate_limited_schedules(self, symmetry, order, check_capacity, max_results, timeout, max_nodes):
+        flex_tasks, twins, prune = self.prepare_search(symmetry, order, check_capacity)
+        layout = self.make_layout(flex_tasks)
+        self.set_limits(max_nodes, timeout)
+        found = self.backtrack(flex_tasks, self.week.copy(), [], twins, prune)
+        results = []
+        try:
+            for starts in found:
+                # the search goes on to the next schedule first, so it is only truncated if there is one more
+                if max_results is not None and len(results) >= max_results:
+                    self.truncated = True
+                    break
+                results.append(ScheduleResult(layout, starts))
+        except SearchTruncated:
+            self.truncated = True
+        finally:
+            found.close()
+            self.clear_limits()
         return results
 
+    # This method splits the search on the slots of the first one or two flexible tasks. Every prefix of start hours
+    # is a subtree that a worker process searches on its own and sends back as tuples of start hours, since those
+    # are much smaller to send than whole schedules. The prefixes are listed in the serial search order and map
+    # keeps that order, so putting the subtrees back together gives exactly the serial results. The workers are
+    # started with only what they search with, see init_search_worker, so they also work with the spawn and forkserver
+    # start methods. mp_context is the multiprocessing context to start them with, the default one if it is None.
+    def generate_flexible_schedules_parallel(self, symmetry, workers, order=None, check_capacity=True,
+                                             mp_context=None):
+        flex_tasks, twins, prune = self.prepare_search(symmetry, order, check_capacity)
+        if not flex_tasks:
+            return list(self.iter_flexible_schedules(symmetry, order, check_capacity))
+        week = self.week.copy()
+        prefixes = list(self.backtrack(flex_tasks[:1], week, [], twins))
+        if len(prefixes) < workers * 4 and len(flex_tasks) > 1:
+            self.stats.reset()
+            prefixes = list(self.backtrack(flex_tasks[:2], week, [], twins))
+
+        # The prefixes were counted as nodes and results of the split search, the workers count them again as the roots
+        # of their subtrees.
+        self.stats.nodes -= len(prefixes)
+        self.stats.results -= len(prefixes)
+
+        results = []
+        layout = self.make_layout(flex_tasks)
+        payload = (self.week.strategy, self.week.weeks, self.week.placements, flex_tasks, symmetry, check_capacity,
+                   self.cache_size)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=init_search_worker,
+                                 initargs=(payload,)) as executor:
+            chunksize = max(1, len(prefixes) // (workers * 4))
+            for subtree, stats in executor.map(search_subtree, prefixes, chunksize=chunksize):
+                self.stats.add(stats)
+                for starts in subtree:
+                    results.append(ScheduleResult(layout, starts))
+        return results
+
+    # This method streams every flexible schedule straight to a file as it is generated instead of building a list,
+    # so memory stays flat no matter how many there are. file_format is "jsonl" or "binary" (see export.py). It
+    # returns the number of schedules written.
+    def export_flexible_schedules(self, filename, file_format="jsonl", symmetry=None, order=None, check_capacity=True):
+        flex_tasks, twins, prune = self.prepare_search(symmetry, order, check_capacity)
+        week = self.week.copy()
+        return write_schedules(filename, file_format, flex_tasks, self.backtrack(flex_tasks, week, [], twins, prune))
+
+    # This method returns only the k best schedules for an objective (see objective.py), best first, with ties kept
+    # in the order the search finds them. It uses branch and bound: once k schedules are kept, any branch whose
+    # objective bound cannot beat the worst of them is cut off, so big weeks can be ranked without going through
+    # every combination.
+    def best_schedules(self, k, objective, symmetry=None, order=None, check_capacity=True):
+        if k <= 0:
+            return []
+        flex_tasks, twins, capacity_prune = self.prepare_search(symmetry, order, check_capacity)
+        week = self.week.copy()
+        # max heap on (score, order found) through negation, the top is the worst schedule that is kept
+        kept = []
+
+        def prune(week, starts):
+            if capacity_prune is not None and capacity_prune(week, starts):
+                return True
+            return len(kept) == k and objective.bound(week, flex_tasks, starts) >= -kept[0][0]
+
+        for found, starts in enumerate(self.backtrack(flex_tasks, week, [], twins, prune)):
+            score = objective.score(week, flex_tasks, starts)
+            if len(kept) < k:
+                heapq.heappush(kept, (-score, -found, starts))
+            elif (score, found) < (-kept[0][0], -kept[0][1]):
+                heapq.heapreplace(kept, (-score, -found, starts))
+        kept.sort(key=lambda item: (-item[0], -item[1]))
+        layout = self.make_layout(flex_tasks)
+        return [ScheduleResult(layout, starts) for _, _, starts in kept]
+
+    # This method runs one whole calculation, placing the fixed tasks, generating every flexible schedule and
+    # rendering the first render_limit of them (all of them if it is None), and times each phase of it. Slot search,
+    # placement and capacity checks are timed by wrapping those calls on the working week, so they add a little
+    # overhead to every node. The search starts with an empty slot cache, so earlier calculations do not hide slot
+    # search time, and the lookups in it are timed on their own line with the hits counted. Making the ScheduleResult
+    # of each schedule found is timed as result construction. It returns the list of ScheduleResult objects and the
+    # Profile (see instrumentation.py).
+    def profile_calculation(self, render_limit=100, symmetry=None, order=None, check_capacity=True):
+        profile = Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        slot_cache = self.slot_cache
+        try:
+            with profile.phase("fixed placement"):
+                self.generate_fixed_schedule()
+            flex_tasks, twins, prune = self.prepare_search(symmetry, order, check_capacity)
+            with profile.phase("copying/snapshotting"):
+                layout = self.make_layout(flex_tasks)
+                week = self.week.copy()
+            week.get_available_slots = profile.timed(
+                "slot search (" + type(self.week.strategy).__name__ + ")", week.get_available_slots)
+            week.place_task = profile.timed("placement", week.place_task)
+            week.remove_task = profile.timed("placement", week.remove_task)
+            if prune is not None:
+                prune = profile.timed("capacity checks", prune)
+            self.slot_cache = LRUCache(self.cache_size)
+            self.slot_cache.get = profile.timed("slot cache lookups", self.slot_cache.get)
+
+            before = tracemalloc.get_traced_memory()[0]
+            results = []
+            with profile.phase("search"):
+                for starts in self.backtrack(flex_tasks, week, [], twins, prune):
+                    with profile.phase("result construction"):
+                        results.append(ScheduleResult(layout, starts))
+            profile.result_bytes = tracemalloc.get_traced_memory()[0] - before
+            profile.results = len(results)
+            profile.cache_hits = self.slot_cache.hits
+
+            for result in results[:render_limit]:
+                with profile.phase("rendering"):
+                    result.print_day_tasks()
+            profile.peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            self.slot_cache = slot_cache
+            if not tracing:
+                tracemalloc.stop()
+        return results, profile
+
+
+# The scheduler and search options a worker process searches with, set once per process by init_search_worker so
+# they are not sent again with every subtree.
+search_worker_state = {}
+
+# Builds the scheduler of a worker process from the payload generate_flexible_schedules_parallel sends: the strategy,
+# the number of weeks, the placements of the fixed week, the flexible tasks in search order, the symmetry and
+# check_capacity options and the cache size. Only these are pickled, not the Scheduler with its calculations, store
+# and caches. The flexible tasks are added in search order, so prepare_search puts them in the same order as the
+# parent did without being given the order option again.
+def init_search_worker(payload):
+    strategy, weeks, fixed_placements, flex_tasks, symmetry, check_capacity, cache_size = payload
+    scheduler = Scheduler(strategy, cache_size=cache_size, verbose=False, weeks=weeks)
+    for start_hour, task in fixed_placements:
+        scheduler.week.place_task(task, start_hour)
+    for task in flex_tasks:
+        scheduler.add_task(task)
+    search_worker_state["scheduler"] = scheduler
+    search_worker_state["search"] = scheduler.prepare_search(symmetry, None, check_capacity)
 
+# Searches the subtree below a prefix of start hours in a worker process and returns the start hours of every
+# schedule in it, in the serial order, along with the search counters for the subtree.
+def search_subtree(prefix):
+    scheduler = search_worker_state["scheduler"]
+    flex_tasks, twins, prune = search_worker_state["search"]
+    scheduler.stats = SearchStats()
+    week = scheduler.week.copy()
+    for task, start_hour in zip(flex_tasks, prefix):
+        week.place_task(task, start_hour)
+    return list(scheduler.backtrack(flex_tasks, week, list(prefix), twins, prune)), scheduler.stats
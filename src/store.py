@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import time
+from array import array
+from threading import Lock
+from task import FixedTask
+
+# Bumped whenever the order or meaning of the stored start hours changes, so old stores are not read back wrongly.
+STORE_VERSION = 1
+
+# Returns the key a calculation is stored under: a hash of the strategy, its slot length, the number of weeks and
+# the tasks in order, written out field by field the way TaskFactory makes them. Two schedulers with the same key find
+# the same schedules in the same order.
+def calculation_key(strategy, weeks, tasks):
+    normalized = []
+    for task in tasks:
+        if isinstance(task, FixedTask):
+            normalized.append(["fixed", task.name, task.duration, task.start_time, task.days_of_week])
+        else:
+            normalized.append(["flexible", task.name, task.duration])
+    text = json.dumps([STORE_VERSION, type(strategy).__name__, strategy.slot_minutes, weeks, normalized],
+                      separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# A persistent store of calculated schedules in a SQLite file, so a calculation done before the app was restarted does
+# not have to be searched again. Each calculation keeps the start hours of its schedules in chunks of unsigned shorts,
+# like ScheduleResult does, and whether it has all of them or only the ones found before it was stopped. When the
+# file grows over max_bytes the calculations used least recently are dropped. It can be used from the background
+# search thread of the GUI.
+class ScheduleStore:
+    # Extra bytes counted for every chunk on top of its data, for the row and the index.
+    CHUNK_OVERHEAD = 64
+
+    def __init__(self, filename, max_bytes=256 * 1024 * 1024):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS calculations (key TEXT PRIMARY KEY, tasks INTEGER NOT NULL, "
+                "results INTEGER NOT NULL, chunks INTEGER NOT NULL, complete INTEGER NOT NULL, "
+                "bytes INTEGER NOT NULL, used REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (key TEXT NOT NULL, chunk INTEGER NOT NULL, data BLOB NOT NULL, "
+                "PRIMARY KEY (key, chunk))")
+
+    # Returns (number of schedules stored, whether that is all of them) for a calculation, or None if it is not
+    # stored. It also marks the calculation as just used.
+    def lookup(self, key):
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT results, complete FROM calculations WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE calculations SET used = ? WHERE key = ?", (time.time(), key))
+        return row[0], bool(row[1])
+
+    # Yields the stored start hours of a calculation as tuples, in the order they were found. Only one chunk is read
+    # at a time.
+    def iter_results(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT tasks, results, chunks FROM calculations WHERE key = ?",
+                                          (key,)).fetchone()
+        if row is None:
+            return
+        num_tasks, results, chunks = row
+        if num_tasks == 0:
+            # a calculation without flexible tasks has the one empty schedule
+            for _ in range(results):
+                yield ()
+            return
+        for chunk in range(chunks):
+            with self.lock:
+                data = self.connection.execute("SELECT data FROM chunks WHERE key = ? AND chunk = ?",
+                                               (key, chunk)).fetchone()
+            if data is None:
+                # dropped by another store on the same file
+                return
+            starts = array('H')
+            starts.frombytes(data[0])
+            for i in range(0, len(starts), num_tasks):
+                yield tuple(starts[i:i + num_tasks])
+
+    # Adds schedules found for a calculation, position is how many of its schedules came before them. They are only
+    # added if the store has exactly those, so schedules never end up stored out of order, for example after the
+    # calculation was dropped to make room. complete says that no schedules come after them.
+    def append(self, key, num_tasks, position, starts_list, complete=False):
+        if self.connection is None:
+            return
+        data = array('H', [start_hour for starts in starts_list for start_hour in starts]).tobytes()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT results, chunks FROM calculations WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                if position != 0:
+                    return
+                self.connection.execute(
+                    "INSERT INTO calculations (key, tasks, results, chunks, complete, bytes, used) "
+                    "VALUES (?, ?, 0, 0, 0, 0, ?)", (key, num_tasks, time.time()))
+                row = (0, 0)
+            results, chunks = row
+            if results != position:
+                return
+            if starts_list:
+                self.connection.execute("INSERT INTO chunks (key, chunk, data) VALUES (?, ?, ?)", (key, chunks, data))
+                chunks += 1
+            self.connection.execute(
+                "UPDATE calculations SET results = ?, chunks = ?, complete = ?, bytes = bytes + ?, used = ? "
+                "WHERE key = ?",
+                (results + len(starts_list), chunks, int(complete),
+                 len(data) + self.CHUNK_OVERHEAD if starts_list else 0, time.time(), key))
+            self.evict()
+
+    # Drops the calculations used least recently until the stored schedules take up at most max_bytes. Called with
+    # the lock held.
+    def evict(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM calculations").fetchone()[0]
+        while total > self.max_bytes:
+            key, size = self.connection.execute(
+                "SELECT key, bytes FROM calculations ORDER BY used LIMIT 1").fetchone()
+            self.connection.execute("DELETE FROM chunks WHERE key = ?", (key,))
+            self.connection.execute("DELETE FROM calculations WHERE key = ?", (key,))
+            total -= size
+
+    # Total bytes counted for the stored schedules.
+    def size(self):
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM calculations").fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM chunks")
+            self.connection.execute("DELETE FROM calculations")
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
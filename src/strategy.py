@@ -1,54 +1,341 @@
 from abc import ABC, abstractmethod
+from collections import Counter
+from math import comb, factorial
+from week import occupancy_mask
+# numpy is optional, it is only needed for the NumpySlotSearch backend
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # This class implements the Strategy pattern, and each strategy must implement the get_available_slots method
 # so that we can have proper behavior.
 class SchedulingStrategy(ABC):
+    # The length of one slot of the week in minutes, an hour unless the strategy is made with another granularity.
+    slot_minutes = 60
+
+    def __init__(self, slot_minutes=60):
+        if slot_minutes <= 0 or 60 % slot_minutes != 0:
+            raise ValueError("The slot length must divide an hour, like 60, 30, 15 or 5 minutes.")
+        self.slot_minutes = slot_minutes
+
+    @property
+    def slots_per_hour(self):
+        return 60 // self.slot_minutes
+
+    @property
+    def slots_per_day(self):
+        return 24 * self.slots_per_hour
+
     @abstractmethod
     def get_available_slots(self, twentyfour_hr_sched, task_duration):
         raise NotImplementedError
 
-# The earliest slot strategy sequentially goes through the schedule and starts off with the earliest slots
-# available, but it will go through all possibilities.
-class EarliestSlotStrategy(SchedulingStrategy):
-    def __init__(self):
-        pass
-    
-    # Checks if in the schedule and start hour an opening is available of length duration.
+    # The Week calls this method so that a strategy can use the week's occupancy bitmask instead of the slot list.
+    # Strategies that do not override it just get the slot list through get_available_slots.
+    def get_available_slots_in_week(self, week, task_duration):
+        return self.get_available_slots(week.twentyfour_hr_sched, task_duration)
+
+    # Checks if in the slot list and start hour an opening is available of length duration.
     def is_slot_free(self, start_hour, twentyfour_hr_sched, duration):
         if (start_hour + duration) > len(twentyfour_hr_sched):
             return False
-        print(str(duration))
-        print(str(start_hour))
         return all(twentyfour_hr_sched[hour] is None for hour in range(start_hour, start_hour + duration))
 
+    # Returns whether start_hour is one of the available slots for duration in the week, used to check placements
+    # that were found before the week changed. The default looks through the slot list.
+    def is_available(self, week, start_hour, duration):
+        return start_hour in self.get_available_slots_in_week(week, duration)
+
+    # Returns every start hour where duration hours in a row are free in the occupancy bitmask, in order. Strategies
+    # build their slots on this, so a faster backend like NumpySlotSearch only has to replace this method.
+    def free_start_hours(self, occupancy, num_hours, duration):
+        return mask_to_hours(free_starts_mask(occupancy, num_hours, duration))
+
+    # The same for several durations at once, as a dictionary from duration to start hours.
+    def free_start_hours_batch(self, occupancy, num_hours, durations):
+        return {duration: self.free_start_hours(occupancy, num_hours, duration) for duration in set(durations)}
+
+    # Returns the available slots in the week for several durations at once, as a dictionary by duration.
+    def get_available_slots_batch(self, week, durations):
+        return {duration: self.get_available_slots_in_week(week, duration) for duration in set(durations)}
+
+    # Returns False only when tasks of these durations can definitely not all be placed in the week any more, so the
+    # search can drop the branch early. The default cannot tell for a strategy it does not know, so it says True.
+    def can_fit(self, week, durations):
+        return True
+
+    # Counts how many ways the tasks can be placed in the week, in order, without listing them. This default works
+    # for any strategy whose slots only depend on which hours are taken: it searches like the backtracking does but
+    # remembers the count for every (task index, occupancy) state, so a state reached again is not searched twice.
+    def count_schedules(self, week, tasks):
+        return self.count_from(week, tasks, 0, {})
+
+    def count_from(self, week, tasks, index, memo):
+        if index == len(tasks):
+            return 1
+        key = (index, week.occupancy)
+        if key not in memo:
+            total = 0
+            for start_hour in self.get_available_slots_in_week(week, tasks[index].duration):
+                week.place_task(tasks[index], start_hour)
+                total += self.count_from(week, tasks, index + 1, memo)
+                week.remove_task(tasks[index], start_hour)
+            memo[key] = total
+        return memo[key]
+
+# Returns a bitmask where bit i is set when the duration hours starting at hour i are all free. Each pass of the
+# loop doubles the length of the free runs that are checked, so it only takes about log2(duration) mask operations.
+def free_starts_mask(occupancy, num_hours, duration):
+    free = ~occupancy & ((1 << num_hours) - 1)
+    if duration <= 0:
+        return (1 << num_hours) - 1
+    starts = free
+    length = 1
+    while length < duration:
+        step = min(length, duration - length)
+        starts &= starts >> step
+        length += step
+    return starts
+
+# Returns the positions of the set bits of a mask in increasing order.
+def mask_to_hours(mask):
+    hours = []
+    while mask:
+        lowest = mask & -mask
+        hours.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return hours
+
+# The helpers below count the placements of tasks in free runs for EarliestSlotStrategy.count_schedules. The
+# subsets of a multiset of durations are kept as rows: row k is an int with the number of k-subsets whose total
+# length is T at bit T*width, so adding a task to every subset at once is one shift and add per row.
+
+# Returns the rows after one more task of duration is added to the multiset. length_mask drops the total lengths
+# that are too long for any run.
+def add_subset_task(rows, duration, width, length_mask):
+    return [rows[0]] + [(rows[k] + (rows[k - 1] << (duration * width))) & length_mask for k in range(1, len(rows))]
+
+# Yields the rows, the size and the number of ways to pick it for every sub-multiset of groups, a sorted list of
+# (duration, count). Going from one sub-multiset to the next only adds one task to the rows.
+def sub_multisets(groups, rows, width, length_mask, index=0, size=0, multiplicity=1):
+    if index == len(groups):
+        yield rows, size, multiplicity
+        return
+    duration, count = groups[index]
+    for taken in range(count + 1):
+        yield from sub_multisets(groups, rows, width, length_mask, index + 1, size + taken,
+                                 multiplicity * comb(count, taken))
+        if taken < count:
+            rows = add_subset_task(rows, duration, width, length_mask)
+
+# Returns the weights of a run of length for tasks of up to total_length: for each k an int with comb(length - T + k,
+# k) at bit (cut - T)*width, the ways to leave the gaps around k tasks of total length T. They are packed in reverse,
+# so bit cut*width of a row times them adds up the subsets times their ways. cut is how far the lengths go.
+def run_weights(length, total_length, num_tasks, width):
+    cut = min(length, total_length)
+    return cut, [sum(comb(length - cut + j + k, k) << (j * width) for j in range(cut + 1))
+                 for k in range(num_tasks + 1)]
+
+# Returns the polynomial of a run as a list, its x^k coefficient is the number of ordered ways to put k tasks of the
+# subsets in rows in the run.
+def run_polynomial(rows, weights, width):
+    cut, packed_weights = weights
+    coefficient_mask = (1 << width) - 1
+    return [factorial(k) * (((row * packed) >> (cut * width)) & coefficient_mask)
+            for k, (row, packed) in enumerate(zip(rows, packed_weights))]
+
+# Returns the largest coefficient up to x^n of the product of the (polynomial, power) pairs, with n the degree of the
+# polynomials. It multiplies the lists directly, so it is only used once per count.
+def largest_product_coefficient(powers):
+    n = len(powers[0][0]) - 1
+    product = [1] + [0] * n
+    for polynomial, count in powers:
+        for _ in range(count):
+            product = [sum(product[i] * polynomial[k - i] for i in range(k + 1)) for k in range(n + 1)]
+    return max(product)
+
+# Returns the x^n coefficient of the product of the (polynomial, power) pairs. Each polynomial is packed into an int
+# with its coefficients x_width bits apart, so multiplying two is one int multiplication, and powers are taken by
+# squaring. Keeping the low bits drops the powers of x above n, masking is much faster than pow with a modulus.
+def product_coefficient(powers, n, x_width):
+    x_mask = (1 << ((n + 1) * x_width)) - 1
+    product = 1
+    for polynomial, count in powers:
+        packed = sum(coefficient << (k * x_width) for k, coefficient in enumerate(polynomial))
+        while count:
+            if count & 1:
+                product = (product * packed) & x_mask
+            count >>= 1
+            if count:
+                packed = (packed * packed) & x_mask
+    return product >> (n * x_width)
+
+# The earliest slot strategy sequentially goes through the schedule and starts off with the earliest slots
+# available, but it will go through all possibilities.
+class EarliestSlotStrategy(SchedulingStrategy):
+    def __init__(self, slot_minutes=60):
+        super().__init__(slot_minutes)
+
     def get_available_slots(self, twentyfour_hr_sched, duration):
+        return self.available_slots(occupancy_mask(twentyfour_hr_sched), len(twentyfour_hr_sched), duration)
+
+    # Uses the week's free run index, every start that leaves room for duration hours in a long enough run is
+    # available, so nothing has to be rescanned.
+    def get_available_slots_in_week(self, week, duration):
+        if duration <= 0:
+            return self.available_slots(week.occupancy, week.num_slots, duration)
         return_list = []
-        for i in range(len(twentyfour_hr_sched)):
-            if self.is_slot_free(i, twentyfour_hr_sched, duration):
-                return_list.append(i)
+        for run_start, run_end in week.get_free_runs(duration):
+            return_list.extend(range(run_start, run_end - duration + 1))
         return return_list
 
+    def is_available(self, week, start_hour, duration):
+        if duration <= 0:
+            return super().is_available(week, start_hour, duration)
+        return week.is_free(start_hour, duration)
+
+    # Tasks only go in free runs, so the remaining tasks cannot fit if they need more free hours than are left, if
+    # the longest one is longer than the longest free run, or if the runs cannot hold that many of even the shortest
+    # one.
+    def can_fit(self, week, durations):
+        if not durations or min(durations) <= 0:
+            return True
+        run_lengths = [run_end - run_start for run_start, run_end in week.free_runs]
+        if sum(durations) > sum(run_lengths) or max(durations) > max(run_lengths, default=0):
+            return False
+        shortest = min(durations)
+        return sum(length // shortest for length in run_lengths) >= len(durations)
+
+    # Counts the schedules straight from the lengths of the free runs. Putting a set of k tasks of total length T in
+    # a run of length L can be done in k! * comb(L - T + k, k) ways (their order, then the k+1 gaps around them),
+    # which only depends on k and T. The ways to split the tasks between the runs are added up by inclusion-exclusion
+    # over the sub-multisets S of the durations: for each S the runs' polynomials in x, whose x^k coefficient adds up
+    # the ways to put the k-subsets of S in the run, are multiplied, and their x^n coefficient is added with the sign
+    # of (-1)^(n - |S|), which leaves only the splits that use every task once. That is one product per sub-multiset,
+    # 2^d of them for d different durations, and the runs of the same length are raised to a power together. Finding
+    # out if the tasks fit at all is already bin packing, so some part of the work has to grow this way. The
+    # polynomials are packed into Python ints (see the helpers below), so each step is a few big int operations.
+    def count_schedules(self, week, tasks):
+        durations = [task.duration for task in tasks]
+        if not durations:
+            return 1
+        if min(durations) <= 0:
+            return super().count_schedules(week, tasks)
+        if not self.can_fit(week, durations):
+            return 0
+        n = len(durations)
+        total_length = sum(durations)
+        run_groups = sorted(Counter(run_end - run_start for run_start, run_end in week.get_free_runs(min(durations)))
+                            .items())
+        longest_run = run_groups[-1][0]
+        # every coefficient of the subset rows and run polynomials fits in width bits with room to spare
+        width = (total_length + 1).bit_length() + n + comb(longest_run + n, n).bit_length() + 1
+        length_mask = (1 << ((min(longest_run, total_length) + 1) * width)) - 1
+        weights = {length: run_weights(length, total_length, n, width) for length, _ in run_groups}
+
+        # Every S gives coefficients no bigger than the whole multiset does, so the product for the whole multiset
+        # bounds how far apart the coefficients of the products in x have to be packed.
+        full_rows = [1] + [0] * n
+        for duration in durations:
+            full_rows = add_subset_task(full_rows, duration, width, length_mask)
+        x_width = largest_product_coefficient(
+            [(run_polynomial(full_rows, weights[length], width), count) for length, count in run_groups]).bit_length() + 1
+
+        total = 0
+        for rows, size, multiplicity in sub_multisets(sorted(Counter(durations).items()), [1] + [0] * n, width,
+                                                      length_mask):
+            powers = [(run_polynomial(rows, weights[length], width), count) for length, count in run_groups]
+            total += (-1) ** (n - size) * multiplicity * product_coefficient(powers, n, x_width)
+        return total
+
+    # The slots for several durations come from one pass over the week.
+    def get_available_slots_batch(self, week, durations):
+        return self.free_start_hours_batch(week.occupancy, week.num_slots, durations)
+
+    # Every start hour where duration free hours fit, found for all start hours at once with the bitmask.
+    def available_slots(self, occupancy, num_hours, duration):
+        return self.free_start_hours(occupancy, num_hours, duration)
+
 
 # SingleTaskPerDayAndStartAt9Strategy only allows one flexible task per day and it starts at 9, and if one fixed
 # task is already present per day, that day won't get a fixed task.
 class SingleTaskPerDayAndStartAt9Strategy(SchedulingStrategy):
-    def __init__(self):
-        pass
-    
-    # Checks if in the schedule and start hour an opening is available of length duration.
-    def is_slot_free(self, start_hour, twentyfour_hr_sched, duration):
-        if (start_hour + duration) > len(twentyfour_hr_sched):
-            return False
-        print(str(duration))
-        print(str(start_hour))
-        return all(twentyfour_hr_sched[hour] is None for hour in range(start_hour, start_hour + duration))
+    def __init__(self, slot_minutes=60):
+        super().__init__(slot_minutes)
 
     def get_available_slots(self, twentyfour_hr_sched, duration):
+        return self.available_slots(occupancy_mask(twentyfour_hr_sched), len(twentyfour_hr_sched), duration)
+
+    def get_available_slots_in_week(self, week, duration):
+        return self.available_slots(week.occupancy, week.num_slots, duration)
+
+    def is_available(self, week, start_hour, duration):
+        day_start = start_hour - 9 * self.slots_per_hour
+        return (day_start % self.slots_per_day == 0
+                and week.is_free(day_start, self.slots_per_day))
+
+    # Every task needs a day of its own that is still completely free.
+    def can_fit(self, week, durations):
+        return len(durations) <= len(self.available_slots(week.occupancy, week.num_slots, self.slots_per_day))
+
+    def available_slots(self, occupancy, num_hours, duration):
         #Only one task per day allowed so we need something that is free a full day hours and then we can schedule it anytime
         return_list = []
-        for day in range(7):  # Loop through 7 days
-            # if whole day is free
-            if self.is_slot_free(day*24, twentyfour_hr_sched, 24):
-                day_start = day * 24  # Start hour of the day
-                return_list.append(day_start+9)
+        # a day is free when all of its slots in a row are free from the start of the day
+        for day_start in self.free_start_hours(occupancy, num_hours, self.slots_per_day):
+            if day_start % self.slots_per_day == 0:
+                return_list.append(day_start + 9 * self.slots_per_hour)
         return return_list
+
+# Opt-in NumPy backend for the slot search. A strategy uses it by putting it first in its bases, like
+# NumpyEarliestSlotStrategy below, which then finds the free starts with array operations instead of Python loops:
+# the occupancy bitmask is unpacked into an array of free hours once, and a cumulative sum gives the number of free
+# hours in every window of the duration at the same time. This pays off when a week has many slots.
+class NumpySlotSearch:
+    def __init__(self, *args, **kwargs):
+        if numpy is None:
+            raise ImportError("NumpySlotSearch needs numpy to be installed")
+        super().__init__(*args, **kwargs)
+
+    # Looks the slots up with free_start_hours for every strategy, instead of the free runs of the week.
+    def get_available_slots_in_week(self, week, duration):
+        return self.available_slots(week.occupancy, week.num_slots, duration)
+
+    # Returns the running count of free hours, element i is how many of the first i hours are free.
+    def free_hours_prefix(self, occupancy, num_hours):
+        data = numpy.frombuffer(occupancy.to_bytes((num_hours + 7) // 8, "little"), dtype=numpy.uint8)
+        free = 1 - numpy.unpackbits(data, count=num_hours, bitorder="little").astype(numpy.int32)
+        prefix = numpy.zeros(num_hours + 1, dtype=numpy.int32)
+        numpy.cumsum(free, out=prefix[1:])
+        return prefix
+
+    def starts_from_prefix(self, prefix, num_hours, duration):
+        if duration <= 0:
+            return list(range(num_hours))
+        if duration > num_hours:
+            return []
+        return numpy.flatnonzero(prefix[duration:] - prefix[:-duration] == duration).tolist()
+
+    def free_start_hours(self, occupancy, num_hours, duration):
+        return self.starts_from_prefix(self.free_hours_prefix(occupancy, num_hours), num_hours, duration)
+
+    # All the durations share one cumulative sum.
+    def free_start_hours_batch(self, occupancy, num_hours, durations):
+        prefix = self.free_hours_prefix(occupancy, num_hours)
+        return {duration: self.starts_from_prefix(prefix, num_hours, duration) for duration in set(durations)}
+
+class NumpyEarliestSlotStrategy(NumpySlotSearch, EarliestSlotStrategy):
+    pass
+
+class NumpySingleTaskPerDayAndStartAt9Strategy(NumpySlotSearch, SingleTaskPerDayAndStartAt9Strategy):
+    pass
+
+# The strategies by the names the command line tools (benchmark.py, batch.py) take.
+STRATEGIES = {
+    "earliest": EarliestSlotStrategy,
+    "single": SingleTaskPerDayAndStartAt9Strategy,
+}
+if numpy is not None:
+    STRATEGIES["earliest-numpy"] = NumpyEarliestSlotStrategy
+    STRATEGIES["single-numpy"] = NumpySingleTaskPerDayAndStartAt9Strategy
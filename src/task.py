@@ -1,22 +1,73 @@
-# The class Task is an interface that both FixedTask and FlexibleTask implement.
+import sys
+from weakref import WeakValueDictionary
+
+# The letters of the days of the week, Monday first, in the order of the bits of a days mask.
+DAY_LETTERS = "MTWRFSU"
+
+# Returns the days of a fixed task as a 7-bit mask, bit 0 for Monday up to bit 6 for Sunday. The days can already be
+# a mask, a string of day letters like "MTWRF", or a list of 7 bools like [True, True, True, True, True, False, False].
+def days_mask(days_of_week):
+    if isinstance(days_of_week, int):
+        return days_of_week & 0x7F
+    if isinstance(days_of_week, str):
+        return sum(1 << day for day, letter in enumerate(DAY_LETTERS) if letter in days_of_week)
+    return sum(1 << day for day, on in enumerate(days_of_week) if on)
+
+# Every task that is still in use, by its class and fields, so that equal tasks are one shared object.
+TASKS = WeakValueDictionary()
+
+# The class Task is an interface that both FixedTask and FlexibleTask implement. Tasks are small immutable flyweights:
+# making a task with the same fields as one that already exists returns that one, and the names are interned, so the
+# schedules and calculations that refer to a task all share it and only keep where it is placed. Tasks cannot be
+# changed after they are made, but equal tasks are the same object so they can be compared with is.
 class Task:
-    def __init__(self, name, duration):
-        self.name = name
-        self.duration = duration  # in hours
+    __slots__ = ("name", "duration", "__weakref__")
+    FIELDS = ("name", "duration")
+
+    def __new__(cls, name, duration):
+        return cls.shared(sys.intern(name), duration)
+
+    # Returns the task of this class with these values for FIELDS, made the first time it is asked for.
+    @classmethod
+    def shared(cls, *values):
+        key = (cls,) + values
+        task = TASKS.get(key)
+        if task is None:
+            task = object.__new__(cls)
+            for field, value in zip(cls.FIELDS, values):
+                object.__setattr__(task, field, value)
+            TASKS[key] = task
+        return task
 
-# Fixed Tasks is provided days of week and a start time, along with name and duration.
+    def __setattr__(self, name, value):
+        raise AttributeError("Tasks cannot be changed, make a new one with TaskFactory")
+
+    def __delattr__(self, name):
+        raise AttributeError("Tasks cannot be changed, make a new one with TaskFactory")
+
+    # Pickled tasks are made again through __new__, so a worker process shares them like this one does.
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(repr(getattr(self, field)) for field in self.FIELDS) + ")"
+
+# Fixed Tasks is provided days of week and a start time, along with name and duration. days_of_week is kept as a
+# 7-bit mask (see days_mask).
 class FixedTask(Task):
-    def __init__(self, name, duration, days_of_week, start_time):
-        super().__init__(name, duration)
-        self.start_time = start_time
-        self.days_of_week = days_of_week
-        print("HERE1")
+    __slots__ = ("days_of_week", "start_time")
+    FIELDS = ("name", "duration", "days_of_week", "start_time")
+
+    def __new__(cls, name, duration, days_of_week, start_time):
+        return cls.shared(sys.intern(name), duration, days_mask(days_of_week), start_time)
+
+    # Whether the task happens on a day of the week, 0 for Monday.
+    def on_day(self, day):
+        return bool(self.days_of_week >> day & 1)
 
 # Flexible task only needs name and duration, as it can be flexed into any day if the strategy allows.
 class FlexibleTask(Task):
-    def __init__(self, name, duration):
-        super().__init__(name, duration)
-        print("HERE2")
+    __slots__ = ()
 
 # This class is the implementation of the factoy method pattern. Provided these parameters, the class will
 # return a FixedTask or FlexibleTask depending on the type, as the output of the create_task method.
@@ -1,7 +1,20 @@
-from interpreter import Interpreter, CommandParser, FlexibleTaskParser, FixedTaskParser
+from interpreter import Interpreter, CommandParser, FlexibleTaskParser, FixedTaskParser, CalculateParser
 from scheduler import ScheduleCommand, Scheduler, AddTaskCommand
 from task import TaskFactory, FixedTask, FlexibleTask
 from strategy import SchedulingStrategy, EarliestSlotStrategy, SingleTaskPerDayAndStartAt9Strategy
+from week import Week, WeekRenderer, free_runs_from_mask
+from objective import EarliestFinishObjective, FewestContextSwitchesObjective, MostContiguousFreeTimeObjective
+from export import read_binary
+from result import ScheduleResult
+import benchmark
+from cache import LRUCache
+import batch
+from background import BackgroundSearch, background_export, background_profile
+from scheduler import SearchCancelled
+import time
+from itertools import islice
+import json
+import logging
 
 import pytest
 
@@ -20,7 +33,7 @@ class TestFinalProject():
         assert name == "Work"
         assert duration == 9
         assert start_time == 9
-        assert days_of_week == [True, True, True, True, True, False, False]
+        assert days_of_week == 0b0011111
     
     # Checks if the interpreter can properly parse a flexible task.
     @staticmethod
@@ -73,7 +86,7 @@ class TestFinalProject():
         assert task.name == "Work"
         assert task.duration == 9
         assert task.start_time == 8
-        assert task.days_of_week == "MTWR"
+        assert task.days_of_week == 0b0001111
         
         task = TaskFactory.create_task("flexible", "Laundry", 6, None)
         assert type(task) == FlexibleTask
@@ -372,4 +385,856 @@ class TestFinalProject():
         assert type(list_of_schedules[0].week.twentyfour_hr_sched[21]) is FlexibleTask
         assert type(list_of_schedules[0].week.twentyfour_hr_sched[22]) is FlexibleTask
         assert type(list_of_schedules[0].week.twentyfour_hr_sched[23]) is FlexibleTask
-        assert type(list_of_schedules[0].week.twentyfour_hr_sched[24]) is FlexibleTask
\ No newline at end of file
+        assert type(list_of_schedules[0].week.twentyfour_hr_sched[24]) is FlexibleTask
+    # This method checks that iter_flexible_schedules lazily yields the same schedules, in the same order, as
+    # generate_flexible_schedules.
+    @staticmethod
+    def test_iter_flexible_schedules_EarliestSlotStrategy():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, True, True], 9)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("fixed", "Sleep", 9, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task2).execute()
+        task3 = TaskFactory.create_task("flexible", "Laundry", 2, None)
+        AddTaskCommand(schedule, task3).execute()
+        task4 = TaskFactory.create_task("flexible", "Dishes", 1, None)
+        AddTaskCommand(schedule, task4).execute()
+        schedule.generate_fixed_schedule()
+        iterator = schedule.iter_flexible_schedules()
+        first = next(iterator)
+        # laundry goes in the first opening at 6 pm monday and dishes right after it
+        assert first.week.twentyfour_hr_sched[18].name == "Laundry"
+        assert first.week.twentyfour_hr_sched[20].name == "Dishes"
+        lazy = [first] + list(iterator)
+        eager = schedule.generate_flexible_schedules()
+        assert len(lazy) == len(eager)
+        for a, b in zip(lazy, eager):
+            assert a.week.print_day_tasks() == b.week.print_day_tasks()
+
+    # This method checks that the place/undo search leaves the fixed schedule untouched and that every result
+    # keeps its own placements after the working week has been undone.
+    @staticmethod
+    def test_backtrack_place_undo_keeps_fixed_week():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 20, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("flexible", "Laundry", 2, None)
+        AddTaskCommand(schedule, task2).execute()
+        schedule.generate_fixed_schedule()
+        fixed_before = list(schedule.week.twentyfour_hr_sched)
+        list_of_schedules = schedule.generate_flexible_schedules()
+        # 4 free hours a day gives 3 starts for a 2 hour task on each of the 7 days
+        assert len(list_of_schedules) == 21
+        assert schedule.week.twentyfour_hr_sched == fixed_before
+        assert list_of_schedules[0].week.twentyfour_hr_sched[20:24] == [task2, task2, None, None]
+        assert list_of_schedules[1].week.twentyfour_hr_sched[20:24] == [None, task2, task2, None]
+
+    # This method checks that the search prints nothing per node, even with verbose on, and that each result only
+    # keeps the start hours of the flexible tasks instead of a Scheduler or a Week of its own.
+    @staticmethod
+    def test_backtrack_keeps_only_starts(capsys):
+        schedule = Scheduler(EarliestSlotStrategy())
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 20, "MTWRFSU", 0)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Gym", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        capsys.readouterr()
+        list_of_schedules = schedule.generate_flexible_schedules()
+        assert capsys.readouterr().out == ""
+        assert len(list_of_schedules) > 0
+        for result in list_of_schedules:
+            assert type(result) is ScheduleResult
+            assert len(result.starts) == 2
+            assert result.layout is list_of_schedules[0].layout
+
+    # This method checks that the week's occupancy bitmask follows place_task and remove_task and that the
+    # strategies give the same slots from the bitmask as from the slot list.
+    @staticmethod
+    def test_week_occupancy_bitmask():
+        strategy = EarliestSlotStrategy()
+        week = Week(strategy)
+        task = TaskFactory.create_task("flexible", "Laundry", 3, None)
+        week.place_task(task, 2)
+        assert week.occupancy == 0b11100
+        assert strategy.get_available_slots_in_week(week, 2) == strategy.get_available_slots(week.twentyfour_hr_sched, 2)
+        assert week.get_available_slots(2)[:2] == [0, 5]
+        week.remove_task(task, 2)
+        assert week.occupancy == 0
+        assert len(week.get_available_slots(2)) == 167
+        single = SingleTaskPerDayAndStartAt9Strategy()
+        week = Week(single)
+        week.place_task(task, 30)
+        assert week.get_available_slots(3) == [9, 57, 81, 105, 129, 153]
+
+    # This method checks that the free run index kept by place_task and remove_task always matches the runs
+    # rebuilt from scratch, and that the slots from it match the bitmask slots.
+    @staticmethod
+    def test_week_free_run_index():
+        strategy = EarliestSlotStrategy()
+        week = Week(strategy)
+        task = TaskFactory.create_task("flexible", "Study", 2, None)
+        placed = []
+        for start_hour in [0, 10, 4, 12, 166, 30, 2]:
+            week.place_task(task, start_hour)
+            placed.append(start_hour)
+            assert week.free_runs == free_runs_from_mask(week.occupancy, 168)
+        assert week.free_runs[0] == (6, 10)
+        assert week.get_available_slots(3) == strategy.available_slots(week.occupancy, 168, 3)
+        for start_hour in [4, 166, 0, 12, 2, 30, 10]:
+            week.remove_task(task, start_hour)
+            assert week.free_runs == free_runs_from_mask(week.occupancy, 168)
+        assert week.free_runs == [(0, 168)]
+
+    # This method checks that symmetry breaking only keeps one ordering of interchangeable flexible tasks, so
+    # 3 identical tasks in 7 free hours give C(7,3) schedules instead of 7*6*5.
+    @staticmethod
+    def test_symmetry_breaking_interchangeable_tasks():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 23, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        for i in range(3):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Study", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert len(schedule.generate_flexible_schedules()) == 210
+        list_of_schedules = schedule.generate_flexible_schedules(symmetry="name")
+        assert len(list_of_schedules) == 35
+        rendered = set(result.week.print_day_tasks() for result in list_of_schedules)
+        assert len(rendered) == 35
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 1, None)).execute()
+        # Laundry is only interchangeable with the study blocks when only the duration has to match
+        assert len(schedule.generate_flexible_schedules(symmetry="name")) == 140
+        assert len(schedule.generate_flexible_schedules(symmetry="duration")) == 35
+        with pytest.raises(ValueError):
+            schedule.generate_flexible_schedules(symmetry="bogus")
+
+    # This method checks that count_flexible_schedules gives the same number as listing the schedules, for both
+    # strategies and with symmetry breaking.
+    @staticmethod
+    def test_count_flexible_schedules():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, True, True], 9)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("fixed", "Sleep", 9, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task2).execute()
+        for name, duration in [("Study", 2), ("Study", 2), ("Laundry", 3)]:
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert schedule.count_flexible_schedules() == len(schedule.generate_flexible_schedules())
+        assert schedule.count_flexible_schedules("name") == len(schedule.generate_flexible_schedules("name"))
+
+        schedule = Scheduler(SingleTaskPerDayAndStartAt9Strategy())
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 9, [True, True, False, False, False, False, False], 9)).execute()
+        for i in range(3):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Study", 2, None)).execute()
+        schedule.generate_fixed_schedule()
+        # 5 free days for 3 tasks
+        assert schedule.count_flexible_schedules() == 60
+        assert len(schedule.generate_flexible_schedules()) == 60
+
+    # This method checks that counting a week with far too many schedules to list finishes and gives the exact
+    # number, 10 one hour tasks in a free week is 168*167*...*159.
+    @staticmethod
+    def test_count_flexible_schedules_large():
+        schedule = Scheduler(EarliestSlotStrategy())
+        for i in range(10):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(i), 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        expected = 1
+        for i in range(10):
+            expected *= 168 - i
+        assert schedule.count_flexible_schedules() == expected
+
+    # This method checks the counts for many tasks of different durations. In a free week they all go in one run,
+    # where 12 tasks of total length 78 can be placed in 12! * comb(168 - 78 + 12, 12) ways. The count over four
+    # weeks of quarter hours is the one the earlier split over the runs gave, and a small dense week is checked
+    # against the default count of SchedulingStrategy. How long the counts take is measured by benchmark.py.
+    @staticmethod
+    def test_count_distinct_durations():
+        from math import comb, factorial
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        for i in range(12):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(i), i + 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert schedule.count_flexible_schedules() == factorial(12) * comb(168 - 78 + 12, 12)
+
+        schedule = Scheduler(EarliestSlotStrategy(15), verbose=False, weeks=4)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Sleep", 32, "MTWRFSU", 0)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 36, "MTWRF", 36)).execute()
+        for i in range(10):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(i), i + 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert schedule.count_flexible_schedules() == 172594633796088603804069312000
+
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Sleep", 19, "MTWRFSU", 0)).execute()
+        for duration in (1, 2, 2, 3):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(duration), duration, None)).execute()
+        schedule.generate_fixed_schedule()
+        tasks = schedule.get_flexible_tasks()
+        assert (schedule.week.strategy.count_schedules(schedule.week.copy(), tasks)
+                == SchedulingStrategy.count_schedules(schedule.week.strategy, schedule.week.copy(), tasks)
+                == len(schedule.generate_flexible_schedules()) > 0)
+
+    # This method checks the helpers of the count on their own: the sub-multisets of two 1s and a 2 with the ways to
+    # pick them, and the polynomial of a run of 5 for the tasks 1, 1 and 2, whose x^k coefficient is the number of
+    # ordered ways to put k of them in it.
+    @staticmethod
+    def test_count_helpers():
+        from math import comb, factorial
+        from strategy import add_subset_task, sub_multisets, run_weights, run_polynomial, product_coefficient
+        width = 16
+        length_mask = (1 << (6 * width)) - 1
+        picks = [(size, multiplicity) for _, size, multiplicity in
+                 sub_multisets([(1, 2), (2, 1)], [1, 0, 0, 0], width, length_mask)]
+        assert picks == [(0, 1), (1, 1), (1, 2), (2, 2), (2, 1), (3, 1)]
+        rows = [1, 0, 0, 0]
+        for duration in (1, 1, 2):
+            rows = add_subset_task(rows, duration, width, length_mask)
+        # the k-subsets by total length T at bit T*width: two 1s and a 2 for k=1, a 1 + 1 and two 1 + 2 for k=2
+        assert rows[1] == (2 << width) + (1 << (2 * width)) and rows[2] == (1 << (2 * width)) + (2 << (3 * width))
+        polynomial = run_polynomial(rows, run_weights(5, 4, 3, width), width)
+        assert polynomial == [1, 2 * 5 + 4, factorial(2) * (comb(5, 2) + 2 * comb(4, 2)), factorial(3) * comb(4, 3)]
+        # two runs of 5: the x^2 coefficient of the square is 2 * polynomial[2] + polynomial[1]^2
+        assert product_coefficient([(polynomial, 2)], 2, 32) == 2 * polynomial[2] + polynomial[1] ** 2
+
+    # This method checks that the parallel search with a process pool gives the same schedules in the same order
+    # as the serial search.
+    @staticmethod
+    def test_generate_flexible_schedules_parallel():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, True, True], 9)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("fixed", "Sleep", 9, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task2).execute()
+        for name, duration in [("Laundry", 3), ("Study", 2), ("Study", 2)]:
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        schedule.generate_fixed_schedule()
+        for symmetry in [None, "name"]:
+            serial = schedule.generate_flexible_schedules(symmetry)
+            parallel = schedule.generate_flexible_schedules(symmetry, workers=2)
+            assert len(parallel) == len(serial)
+            for a, b in zip(serial, parallel):
+                assert a.week.twentyfour_hr_sched == b.week.twentyfour_hr_sched
+
+    # This method checks that the parallel search works when the workers are spawned, which only works if what is
+    # sent to them can be pickled. The scheduler has a store and a running calculation, neither of which can be.
+    @staticmethod
+    def test_generate_flexible_schedules_parallel_spawn(tmp_path):
+        import multiprocessing
+        from store import ScheduleStore
+        store = ScheduleStore(str(tmp_path / "schedules.db"))
+        schedule = Scheduler(EarliestSlotStrategy(30), verbose=False, weeks=2, store=store)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Sleep", 40, "MTWRFSU", 0)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 6, "MTWRF", 42)).execute()
+        for name, duration in [("Study", 2), ("Laundry", 3), ("Study", 2)]:
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        calculation = schedule.iter_calculation()
+        next(calculation)
+        serial = schedule.generate_flexible_schedules("name", order="longest_first")
+        parallel = schedule.generate_flexible_schedules("name", workers=2, order="longest_first",
+                                                        mp_context=multiprocessing.get_context("spawn"))
+        assert len(parallel) == len(serial) > 0
+        assert [list(result.starts) for result in parallel] == [list(result.starts) for result in serial]
+        assert parallel[0].tasks == serial[0].tasks
+        store.close()
+
+    # This method checks that best_schedules ranks schedules by the objective and that branch and bound lets it
+    # answer for a week with far too many schedules to go through (168*167*...*163 of them here).
+    @staticmethod
+    def test_best_schedules_branch_and_bound():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 20, [True, True, True, True, True, True, False], 0)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 3, None)).execute()
+        schedule.generate_fixed_schedule()
+        best = schedule.best_schedules(3, MostContiguousFreeTimeObjective())
+        # Laundry is kept out of the long free block from saturday night through sunday
+        assert len(best) == 3
+        assert best[0].week.twentyfour_hr_sched[20] is schedule.tasks[1]
+        for result in best:
+            assert result.week.twentyfour_hr_sched[140:168] == [None] * 28
+
+        schedule = Scheduler(EarliestSlotStrategy())
+        for i in range(6):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(i), 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        best = schedule.best_schedules(2, EarliestFinishObjective())
+        flex_tasks = schedule.get_flexible_tasks()
+        assert best[0].week.twentyfour_hr_sched[:6] == flex_tasks
+        assert best[1].week.twentyfour_hr_sched[:6] == flex_tasks[:4] + [flex_tasks[5], flex_tasks[4]]
+        assert schedule.best_schedules(1, FewestContextSwitchesObjective())[0].week.twentyfour_hr_sched[0] is flex_tasks[0]
+
+    # This method checks that the task order heuristics find the same set of schedules and that weeks where the
+    # flexible tasks cannot fit fail right away instead of searching the whole tree.
+    @staticmethod
+    def test_task_order_and_capacity_pruning():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, True, True], 9)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("fixed", "Sleep", 9, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task2).execute()
+        for name, duration in [("Study", 1), ("Laundry", 4), ("Dishes", 2)]:
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert [task.name for task in schedule.get_flexible_tasks("longest_first")] == ["Laundry", "Dishes", "Study"]
+        expected = sorted(str([t.name if t else "" for t in r.week.twentyfour_hr_sched]) for r in schedule.generate_flexible_schedules(check_capacity=False))
+        for order in [None, "longest_first", "fewest_slots"]:
+            found = sorted(str([t.name if t else "" for t in r.week.twentyfour_hr_sched]) for r in schedule.generate_flexible_schedules(order=order))
+            assert found == expected
+
+        # 3 free hours a day only hold one 2 hour task each, so 10 of them cannot fit in the week
+        schedule = Scheduler(EarliestSlotStrategy())
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 21, [True, True, True, True, True, True, True], 0)).execute()
+        for i in range(10):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Chore", 2, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert schedule.generate_flexible_schedules() == []
+
+        # one task per free day, so 8 tasks in a week with 7 free days never fit
+        schedule = Scheduler(SingleTaskPerDayAndStartAt9Strategy())
+        for i in range(8):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Chore", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        assert schedule.generate_flexible_schedules() == []
+
+    # This method checks that export_flexible_schedules streams every schedule to a JSON lines file and to the binary
+    # start hour format, and that the binary file reads back to the same start hours.
+    @staticmethod
+    def test_export_flexible_schedules(tmp_path):
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, True, True], 9)
+        AddTaskCommand(schedule, task).execute()
+        task2 = TaskFactory.create_task("fixed", "Sleep", 9, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task2).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 4, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        expected = schedule.count_flexible_schedules()
+
+        jsonl_file = tmp_path / "schedules.jsonl"
+        assert schedule.export_flexible_schedules(str(jsonl_file), "jsonl") == expected
+        lines = jsonl_file.read_text().splitlines()
+        assert len(lines) == expected
+        assert json.loads(lines[0]) == {"schedule": 1, "placements": [["Laundry", 18], ["Dishes", 22]]}
+
+        binary_file = tmp_path / "schedules.bin"
+        assert schedule.export_flexible_schedules(str(binary_file), "binary") == expected
+        tasks, records = read_binary(str(binary_file))
+        assert tasks == [("Laundry", 4), ("Dishes", 1)]
+        assert [json.loads(line)["placements"] for line in lines] == [[["Laundry", a], ["Dishes", b]] for a, b in records]
+
+        with pytest.raises(ValueError):
+            schedule.export_flexible_schedules(str(binary_file), "csv")
+
+    # This method checks that without flexible tasks the one empty schedule is written and read back as one record
+    # in both formats.
+    @staticmethod
+    def test_export_without_flexible_tasks(tmp_path):
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 9, "MTWRF", 9)).execute()
+        schedule.generate_fixed_schedule()
+        jsonl_file = tmp_path / "schedules.jsonl"
+        assert schedule.export_flexible_schedules(str(jsonl_file), "jsonl") == 1
+        assert [json.loads(line) for line in jsonl_file.read_text().splitlines()] == [{"schedule": 1, "placements": []}]
+        binary_file = tmp_path / "schedules.bin"
+        assert schedule.export_flexible_schedules(str(binary_file), "binary") == 1
+        tasks, records = read_binary(str(binary_file))
+        assert tasks == [] and list(records) == [()]
+
+    # This method checks that results are compact ScheduleResults that share one layout and only keep start hours,
+    # and that the week built from them is the same one the search placed.
+    @staticmethod
+    def test_compact_schedule_results():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 20, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        laundry = TaskFactory.create_task("flexible", "Laundry", 2, None)
+        AddTaskCommand(schedule, laundry).execute()
+        schedule.generate_fixed_schedule()
+        list_of_schedules = schedule.generate_flexible_schedules()
+        assert all(type(result) is ScheduleResult for result in list_of_schedules)
+        assert list_of_schedules[0].layout is list_of_schedules[20].layout
+        assert list(list_of_schedules[1].starts) == [21]
+        assert list_of_schedules[1].placements() == [(laundry, 21)]
+        assert list_of_schedules[1].week.twentyfour_hr_sched[20:24] == [None, laundry, laundry, None]
+        assert list_of_schedules[1].print_day_tasks() == list_of_schedules[1].week.print_day_tasks()
+        # adding a task afterwards does not change results that were already calculated
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Gym", 4, [True, False, False, False, False, False, False], 20)).execute()
+        schedule.generate_fixed_schedule()
+        assert list_of_schedules[0].week.twentyfour_hr_sched[22] is None
+
+    # This method checks that the cached renderer gives exactly the same text as print_day_tasks on the full week,
+    # one at a time and in bulk.
+    @staticmethod
+    def test_week_renderer_matches_print_day_tasks():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, False, False], 9)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 7, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        list_of_schedules = schedule.generate_flexible_schedules()[::500]
+        rendered = list_of_schedules[0].layout.render_many(list_of_schedules)
+        for result, text in zip(list_of_schedules, rendered):
+            assert result.print_day_tasks() == result.week.print_day_tasks() == text
+        assert rendered[0].startswith("Monday:\n\t0-1 am: Laundry\n")
+        assert "\t9-10 am: Work\n" in rendered[0]
+        assert "\t11-12 pm: \nTuesday:\n" in rendered[0]
+        assert WeekRenderer(schedule.week).render([]) == schedule.week.print_day_tasks()
+
+    # This method checks the search counters that are left on the scheduler after a run, that the parallel search
+    # counts the same, and that the per node trace only shows up when debug logging is turned on.
+    @staticmethod
+    def test_search_stats_and_tracing(caplog):
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 22, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        list_of_schedules = schedule.generate_flexible_schedules()
+        stats = schedule.stats.as_dict()
+        # 7 slots for laundry, then 12 free hours left for dishes each time
+        assert stats == {"nodes": 1 + 7 + 84, "slots_probed": 7 + 7 * 12, "placements": 91, "undos": 91, "results": 84}
+        assert len(list_of_schedules) == stats["results"]
+        assert not caplog.records
+
+        schedule.generate_flexible_schedules(workers=2)
+        assert schedule.stats.as_dict() == stats
+
+        with caplog.at_level(logging.DEBUG, logger="scheduler.search"):
+            schedule.generate_flexible_schedules()
+        assert len(caplog.records) == stats["nodes"]
+        assert "Laundry (2 hours): 7 slots" in caplog.records[0].getMessage()
+
+    # This method runs a small benchmark workload and checks that the report has its numbers and that comparing a
+    # run with itself gives no change.
+    @staticmethod
+    def test_benchmark_workload():
+        workload = {"name": "tiny", "strategy": "earliest", "fixed": 1, "fixed_hours": 22, "days": 7,
+                    "flexible": 2, "min_duration": 1, "max_duration": 2, "seed": 7}
+        count_workload = {"name": "tiny-count", "strategy": "earliest", "fixed": 1, "fixed_hours": 20, "days": 7,
+                          "flexible": 3, "durations": [1, 2, 3], "seed": 7, "max_seconds": 1.0}
+        report = benchmark.run_benchmarks([workload], count_workloads=[count_workload])
+        result = report["results"][0]
+        schedule = benchmark.build_scheduler(workload)
+        schedule.generate_fixed_schedule()
+        assert result["name"] == "tiny"
+        assert result["schedules"] == schedule.count_flexible_schedules() > 0
+        assert result["nodes"] > result["schedules"]
+        assert result["peak_bytes"] > 0 and result["fixed_peak_bytes"] > 0
+        assert json.loads(json.dumps(report)) == report
+        assert benchmark.compare(report, report)[0].startswith("tiny")
+        assert "time x1.00" in benchmark.compare(report, report)[0]
+        assert "fixed peak memory x1.00" in benchmark.compare(report, report)[0]
+        count_schedule = benchmark.build_scheduler(count_workload)
+        count_schedule.generate_fixed_schedule()
+        assert report["counts"][0]["count"] == len(count_schedule.generate_flexible_schedules()) > 0
+        assert benchmark.compare(report, report)[1].startswith("tiny-count")
+
+    # This method checks that a profiled calculation finds the same schedules as the normal one and times every phase.
+    @staticmethod
+    def test_profile_calculation():
+        schedule = Scheduler(EarliestSlotStrategy(), profile=True)
+        task = TaskFactory.create_task("fixed", "Work", 22, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        results, profile = schedule.profile_calculation(render_limit=5)
+        expected = schedule.generate_flexible_schedules()
+        assert [list(result.starts) for result in results] == [list(result.starts) for result in expected]
+        for phase in ("fixed placement", "copying/snapshotting", "slot search (EarliestSlotStrategy)", "placement",
+                      "capacity checks", "search"):
+            assert phase in profile.phases
+        assert profile.phases["rendering"][1] == 5
+        assert profile.phases["slot search (EarliestSlotStrategy)"][1] == 1 + 7
+        # every node before the last task looks in the slot cache, and each placement of Laundry leaves other hours
+        # free for Dishes so none of them is a hit
+        assert profile.phases["slot cache lookups"][1] == 1 + 7 and profile.cache_hits == 0
+        assert profile.phases["result construction"][1] == 84
+        assert profile.seconds("search") >= profile.seconds("placement") + profile.seconds("result construction")
+        assert profile.results == 84 and profile.result_bytes > 0 and profile.peak_bytes > 0
+        assert "bytes per result" in profile.report() and "slot cache" in profile.report()
+        # the slot lists cached by generate_flexible_schedules above do not hide the slot search of the next profile
+        results, profile = schedule.profile_calculation(render_limit=0)
+        assert profile.phases["slot search (EarliestSlotStrategy)"][1] == 1 + 7
+
+    # This method checks that calculating again after adding tasks gives the same schedules as a search from scratch,
+    # that undo goes back to the earlier schedules without searching again, and that placing the fixed tasks again
+    # does not change the week.
+    @staticmethod
+    def test_incremental_calculation():
+        schedule = Scheduler(EarliestSlotStrategy())
+        task = TaskFactory.create_task("fixed", "Work", 20, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        first = schedule.calculate()
+        assert len(first) == 7 * 3
+
+        gym = AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Gym", 1, [True, False, False, False, False, False, False], 21))
+        gym.execute()
+        dishes = AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None))
+        dishes.execute()
+        second = schedule.calculate()
+        schedule.generate_fixed_schedule()
+        schedule.generate_fixed_schedule()
+        assert schedule.week.twentyfour_hr_sched.count(None) == 7 * 4 - 1
+        expected = schedule.generate_flexible_schedules()
+        assert [list(result.starts) for result in second] == [list(result.starts) for result in expected]
+        assert [result.print_day_tasks() for result in second] == [result.print_day_tasks() for result in expected]
+
+        dishes.undo()
+        gym.undo()
+        stats_before = schedule.stats.as_dict()
+        again = schedule.calculate()
+        assert [id(result) for result in again] == [id(result) for result in first]
+        assert schedule.stats.as_dict() == stats_before
+        assert schedule.week.twentyfour_hr_sched[21] is None
+
+    # This method checks that the LRU cache drops the least recently used entry when it is full, and that the search
+    # finds the same schedules with and without the slot cache.
+    @staticmethod
+    def test_slot_cache():
+        cache = LRUCache(2)
+        cache.put("a", [1])
+        cache.put("b", [2])
+        assert cache.get("a") == [1]
+        cache.put("c", [3])
+        assert cache.get("b") is None and cache.get("a") == [1] and cache.get("c") == [3]
+        assert len(cache) == 2 and cache.hits == 3 and cache.misses == 1
+
+        results = []
+        for cache_size in (0, 4096):
+            schedule = Scheduler(EarliestSlotStrategy(), cache_size=cache_size)
+            task = TaskFactory.create_task("fixed", "Work", 20, [True, True, True, True, True, True, True], 0)
+            AddTaskCommand(schedule, task).execute()
+            for name, duration in (("Laundry", 2), ("Dishes", 1), ("Cooking", 1)):
+                AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+            schedule.generate_fixed_schedule()
+            results.append([list(result.starts) for result in schedule.generate_flexible_schedules()])
+            assert len(schedule.slot_cache) <= cache_size
+        assert results[0] == results[1]
+        # Laundry at 20 with Dishes at 22 takes the same hours as Dishes at 20 with Laundry at 21, so Cooking gets a hit
+        assert schedule.slot_cache.hits > 0
+
+    # This method runs the batch mode on two task files and a broken one, and checks that each good file gets its own
+    # results file with the same schedules the Scheduler finds, and that the broken one is reported without stopping
+    # the others.
+    @staticmethod
+    def test_batch_mode(tmp_path):
+        (tmp_path / "a.txt").write_text("fixed Work 22 MTWRFSU 0\n# chores\nflexible Laundry 2\n\nflexible Dishes 1\n")
+        (tmp_path / "b.txt").write_text("fixed Work 9 MTWRF 9\nflexible Gym 1\n")
+        (tmp_path / "bad.txt").write_text("flexible Gym\n")
+        inputs = [str(tmp_path / name) for name in ("a.txt", "b.txt", "bad.txt")]
+        results = batch.run_batch(inputs, "earliest", str(tmp_path / "out"), workers=2)
+        assert [count for _, _, count, _ in results] == [84, 168 - 45, 0]
+        assert results[2][3] == inputs[2] + " line 1: could not read the task"
+        assert results[0][1] == str(tmp_path / "out" / "a.schedules.jsonl")
+        lines = (tmp_path / "out" / "a.schedules.jsonl").read_text().splitlines()
+        assert len(lines) == 84
+        assert json.loads(lines[0]) == {"schedule": 1, "placements": [["Laundry", 22], ["Dishes", 46]]}
+
+        results = batch.run_batch([inputs[1]], "single", file_format="text")
+        assert results == [(inputs[1], str(tmp_path / "b.schedules.txt"), 2, None)]
+        assert (tmp_path / "b.txt").read_text() == "fixed Work 9 MTWRF 9\nflexible Gym 1\n"
+        assert (tmp_path / "b.schedules.txt").read_text().startswith("Schedule 1\nMonday:\n")
+
+    # This method runs a search in the background, cancels it partway and checks that the schedules found until then
+    # are the first ones of the full search, and that the cancelled calculation is not reused by the next one.
+    @staticmethod
+    def test_background_search_cancel():
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        # millions of schedules, so the search is still running when it is cancelled
+        for name, duration in (("Laundry", 2), ("Dishes", 1), ("Cooking", 1), ("Reading", 3)):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        search = BackgroundSearch(schedule, schedule.iter_calculation(max_kept=1000), queue_size=50)
+        search.start()
+        taken = []
+        while len(taken) < 120:
+            result = search.next_result()
+            if result is None:
+                time.sleep(0.01)
+            else:
+                taken.append(result)
+        # the worker waits while the queue is full, so it only ever runs a queue ahead of what was taken
+        time.sleep(0.1)
+        assert search.queue.full() and search.found == 120 + 50 and not search.done
+        search.cancel()
+        assert search.done and search.cancelled and search.error is None
+        while not search.finished():
+            taken.append(search.next_result())
+        assert len(taken) == search.found < schedule.count_flexible_schedules()
+
+        schedule.cancel()
+        with pytest.raises(SearchCancelled):
+            list(schedule.backtrack(schedule.get_flexible_tasks(), schedule.week.copy(), []))
+
+        assert schedule.calculations[-1].failed
+        again = list(islice(schedule.iter_calculation(), len(taken)))
+        assert not any(calculation.failed for calculation in schedule.calculations)
+        assert [list(result.starts) for result in again] == [list(result.starts) for result in taken]
+
+    # This method checks that a calculation with max_kept lets go of its results once it has more than that, and is
+    # then searched again instead of being reused.
+    @staticmethod
+    def test_calculation_max_kept():
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 20, "MTWRFSU", 0)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        expected = [list(result.starts) for result in schedule.calculate()]
+        calculation = schedule.calculations[-1]
+        assert calculation.is_complete() and len(calculation.results) == len(expected)
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Reading", 1, None)).execute()
+        schedule.remove_task(schedule.tasks[-1])
+        assert [list(result.starts) for result in schedule.iter_calculation(max_kept=10)] == expected
+        assert schedule.calculations[-1] is calculation
+
+        schedule.calculations = []
+        assert [list(result.starts) for result in schedule.iter_calculation(max_kept=10)] == expected
+        calculation = schedule.calculations[-1]
+        assert calculation.forgotten and not calculation.is_complete() and calculation.results == []
+        assert [list(result.starts) for result in schedule.iter_calculation(max_kept=10)] == expected
+        assert schedule.calculations == [schedule.calculations[-1]] and schedule.calculations[-1] is not calculation
+
+    # This method checks that an export run in the background reports how many schedules it wrote, and that cancel
+    # stops one that would write millions of them.
+    @staticmethod
+    def test_background_export_cancel(tmp_path):
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        schedule.generate_fixed_schedule()
+        export = background_export(schedule, str(tmp_path / "small.jsonl"), "jsonl")
+        export.start()
+        while not export.done:
+            time.sleep(0.01)
+        assert export.next_result() == 167 and export.finished() and not export.cancelled
+
+        for name, duration in (("Dishes", 1), ("Cooking", 1), ("Reading", 3)):
+            AddTaskCommand(schedule, TaskFactory.create_task("flexible", name, duration, None)).execute()
+        schedule.generate_fixed_schedule()
+        big_file = tmp_path / "big.bin"
+        export = background_export(schedule, str(big_file), "binary")
+        export.start()
+        export.cancel()
+        assert export.cancelled and export.error is None and export.finished()
+        tasks, records = read_binary(str(big_file))
+        assert len(tasks) == 4 and sum(1 for _ in records) < schedule.count_flexible_schedules()
+
+    # This method checks that a profiled calculation run in the background prints its breakdown and then hands out
+    # the same schedules as a calculation without profiling.
+    @staticmethod
+    def test_background_profile(capsys):
+        schedule = Scheduler(EarliestSlotStrategy(), profile=True, verbose=False)
+        AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Work", 22, "MTWRFSU", 0)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        search = background_profile(schedule)
+        search.start()
+        taken = []
+        while not search.finished():
+            result = search.next_result()
+            if result is None:
+                time.sleep(0.01)
+            else:
+                taken.append(result)
+        assert not search.cancelled and search.error is None
+        assert "Profile of the calculation:" in capsys.readouterr().out
+        assert [list(result.starts) for result in taken] == [list(result.starts) for result in schedule.calculate()]
+
+    # This method checks that each limit stops the search with the first schedules of the full search and sets
+    # truncated, that a limit the search does not reach leaves it untruncated, and the parsing of the limits.
+    @staticmethod
+    def test_search_limits():
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        task = TaskFactory.create_task("fixed", "Work", 22, [True, True, True, True, True, True, True], 0)
+        AddTaskCommand(schedule, task).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+        schedule.generate_fixed_schedule()
+        full = [list(result.starts) for result in schedule.generate_flexible_schedules()]
+        assert not schedule.truncated and len(full) == 84
+
+        results = schedule.generate_flexible_schedules(max_results=10)
+        assert schedule.truncated and [list(result.starts) for result in results] == full[:10]
+        results = schedule.generate_flexible_schedules(max_results=84)
+        assert not schedule.truncated and len(results) == 84
+        # the root, the first laundry slot and then one node per dishes slot
+        results = schedule.generate_flexible_schedules(max_nodes=7)
+        assert schedule.truncated and [list(result.starts) for result in results] == full[:5]
+        assert schedule.stats.nodes == 7
+        results = schedule.generate_flexible_schedules(timeout=0)
+        assert schedule.truncated and results == []
+        results = schedule.generate_flexible_schedules(timeout=60, max_nodes=10 ** 6, workers=2)
+        assert not schedule.truncated and [list(result.starts) for result in results] == full
+
+        parser = CalculateParser()
+        assert parser.parse("calculate timeout=2.5") == ("command", "calculate", None, None, None)
+        assert parser.parse_limits("calculate") == {}
+        assert parser.parse_limits("calculate max_results=5 timeout=2.5") == {"max_results": 5, "timeout": 2.5}
+        with pytest.raises(ValueError):
+            parser.parse_limits("calculate results=5")
+
+    # This method checks that the NumPy backend finds the same slots and schedules as the strategies it is mixed into.
+    @staticmethod
+    def test_numpy_slot_search():
+        pytest.importorskip("numpy")
+        from strategy import NumpyEarliestSlotStrategy, NumpySingleTaskPerDayAndStartAt9Strategy, STRATEGIES
+        assert STRATEGIES["earliest-numpy"] is NumpyEarliestSlotStrategy
+        for plain, vectorized in ((EarliestSlotStrategy, NumpyEarliestSlotStrategy),
+                                  (SingleTaskPerDayAndStartAt9Strategy, NumpySingleTaskPerDayAndStartAt9Strategy)):
+            found = []
+            for strategy_cls in (plain, vectorized):
+                schedule = Scheduler(strategy_cls(), verbose=False)
+                task = TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, False, False], 9)
+                AddTaskCommand(schedule, task).execute()
+                task = TaskFactory.create_task("fixed", "Sleep", 8, [True, True, True, True, True, True, True], 0)
+                AddTaskCommand(schedule, task).execute()
+                AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Laundry", 2, None)).execute()
+                AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Dishes", 1, None)).execute()
+                schedule.generate_fixed_schedule()
+                week = schedule.week
+                found.append(([week.get_available_slots(duration) for duration in (0, 1, 7, 16, 24, 200)],
+                              week.strategy.get_available_slots_batch(week, [1, 2, 16]),
+                              [list(result.starts) for result in schedule.generate_flexible_schedules()]))
+            assert found[0] == found[1]
+        assert found[0][0][4] == []
+
+    # This method checks scheduling in 15 minute slots over two weeks, from parsing the times to the rendered days.
+    @staticmethod
+    def test_slot_minutes_and_weeks():
+        strategy = EarliestSlotStrategy(15)
+        assert strategy.slots_per_day == 96
+        with pytest.raises(ValueError):
+            EarliestSlotStrategy(7)
+        schedule = Scheduler(strategy, verbose=False, weeks=2)
+        assert schedule.week.num_slots == 96 * 14
+        task_type, name, duration, start_time, days_of_week = FixedTaskParser(15).parse("fixed Work 8:45 MTWRFSU 9:15")
+        assert (duration, start_time) == (35, 37)
+        with pytest.raises(ValueError):
+            FixedTaskParser(15).parse("fixed Work 8:40 MTWRF 9")
+        AddTaskCommand(schedule, TaskFactory.create_task(task_type, name, duration, days_of_week, start_time)).execute()
+        for line in ("fixed Evening 6 MTWRFSU 18", "fixed Night 8.75 MTWRFSU 0"):
+            task_type, name, duration, start_time, days_of_week = FixedTaskParser(15).parse(line)
+            AddTaskCommand(schedule, TaskFactory.create_task(task_type, name, duration, days_of_week, start_time)).execute()
+        AddTaskCommand(schedule, TaskFactory.create_task(*FlexibleTaskParser(15).parse("flexible Call 0.5"))).execute()
+        schedule.generate_fixed_schedule()
+        # the fixed tasks are in both weeks, so the Monday of the second week has Work at 9:15 too
+        assert schedule.week.twentyfour_hr_sched[7 * 96 + 37] is schedule.tasks[0]
+        # the only free time is 8:45 to 9:15 every day, which fits the half hour call once
+        results = schedule.generate_flexible_schedules()
+        assert [list(result.starts) for result in results] == [[day * 96 + 35] for day in range(14)]
+        text = results[0].print_day_tasks()
+        assert text == results[0].week.print_day_tasks()
+        assert "Week 2 Monday:\n" in text and "\t8:45-9 am: Call\n" in text and "\t9:15-9:30 am: Work\n" in text
+        assert text.count("\n") == 14 * 97
+        # hour slots over one week render as before
+        assert Week(EarliestSlotStrategy()).print_day_tasks().startswith("Monday:\n\t0-1 am: \n")
+
+    # This method checks that scheduling many users with shared fixed tasks gives each user the same schedules as
+    # scheduling them on their own, with and without a pool of workers.
+    @staticmethod
+    def test_schedule_users():
+        def user_tasks(flexible):
+            tasks = [TaskFactory.create_task("fixed", "Work", 9, [True, True, True, True, True, False, False], 9),
+                     TaskFactory.create_task("fixed", "Sleep", 8, [True] * 7, 0)]
+            return tasks + [TaskFactory.create_task("flexible", name, duration, None) for name, duration in flexible]
+        task_sets = {"ana": user_tasks([("Gym", 2)]), "ben": user_tasks([("Gym", 2), ("Read", 1)]),
+                     "cy": user_tasks([("Call", 1)])[1:]}
+        assert batch.fixed_layer_key(task_sets["ana"]) == batch.fixed_layer_key(task_sets["ben"])
+        assert batch.fixed_layer_key(task_sets["ana"]) != batch.fixed_layer_key(task_sets["cy"])
+
+        expected = {}
+        for user, tasks in task_sets.items():
+            schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+            for task in tasks:
+                AddTaskCommand(schedule, task).execute()
+            schedule.generate_fixed_schedule()
+            expected[user] = [result.print_day_tasks() for result in schedule.generate_flexible_schedules(max_results=50)]
+        for workers, chunk_size in ((1, 64), (2, 1)):
+            results = batch.schedule_users(task_sets, "earliest", workers=workers, chunk_size=chunk_size, max_results=50)
+            assert list(results) == ["ana", "ben", "cy"]
+            assert {user: [result.print_day_tasks() for result in found] for user, found in results.items()} == expected
+        with pytest.raises(ValueError):
+            batch.schedule_users(task_sets, "latest")
+
+    # This method checks that the persistent store gives back the same schedules after a restart, carries on from
+    # where a stopped calculation left off, and drops old calculations when it is full.
+    @staticmethod
+    def test_schedule_store(tmp_path):
+        from store import ScheduleStore, calculation_key
+        def make_scheduler(store, flexible=3):
+            schedule = Scheduler(EarliestSlotStrategy(), verbose=False, store=store)
+            AddTaskCommand(schedule, TaskFactory.create_task("fixed", "Sleep", 18, [True] * 7, 0)).execute()
+            for i in range(flexible):
+                AddTaskCommand(schedule, TaskFactory.create_task("flexible", "Task" + str(i), 1 + i % 2, None)).execute()
+            return schedule
+        plain = make_scheduler(None)
+        full = [list(result.starts) for result in plain.calculate()]
+
+        store = ScheduleStore(str(tmp_path / "schedules.db"))
+        schedule = make_scheduler(store)
+        schedule.STORE_CHUNK = 100
+        assert [list(result.starts) for result in islice(schedule.iter_calculation(), 250)] == full[:250]
+        schedule.calculations = []
+        store.close()
+
+        # the schedules still waiting to be saved were saved when the calculation was dropped, and a new store on the
+        # same file, like after a restart, finishes the stopped calculation
+        store = ScheduleStore(str(tmp_path / "schedules.db"))
+        key = calculation_key(EarliestSlotStrategy(), 1, make_scheduler(None).tasks)
+        assert store.lookup(key) == (250, False)
+        schedule = make_scheduler(store)
+        assert [list(result.starts) for result in schedule.calculate()] == full
+        assert schedule.stats.nodes < plain.stats.nodes
+        assert store.lookup(key) == (len(full), True)
+        schedule = make_scheduler(store)
+        assert [list(result.starts) for result in schedule.calculate()] == full
+        assert schedule.stats.nodes == 0
+
+        # another calculation pushes the least recently used one out
+        store.max_bytes = store.size() + 100
+        assert len(make_scheduler(store, flexible=2).calculate()) > 0
+        assert store.lookup(key) is None
+        assert store.size() <= store.max_bytes
+        store.close()
+
+    # This method checks that tasks are immutable shared flyweights with their days as a bitmask, that they survive
+    # pickling, and that undoing one of two equal tasks takes back the last one.
+    @staticmethod
+    def test_task_flyweights():
+        import pickle
+        work = TaskFactory.create_task("fixed", "Work", 9, "MTWRF", 9)
+        assert work is TaskFactory.create_task("fixed", "Work", 9, [True] * 5 + [False] * 2, 9)
+        assert work is not TaskFactory.create_task("fixed", "Work", 9, "MTWR", 9)
+        assert work.days_of_week == 0b0011111 and work.on_day(4) and not work.on_day(5)
+        assert TaskFactory.create_task("flexible", "".join(["Wo", "rk"]), 1, None).name is work.name
+        assert not hasattr(work, "__dict__")
+        with pytest.raises(AttributeError):
+            work.duration = 4
+        assert pickle.loads(pickle.dumps(work)) is work
+
+        schedule = Scheduler(EarliestSlotStrategy(), verbose=False)
+        gym = TaskFactory.create_task("flexible", "Gym", 2, None)
+        read = TaskFactory.create_task("flexible", "Read", 1, None)
+        commands = [AddTaskCommand(schedule, task)
+                    for task in (gym, read, TaskFactory.create_task("flexible", "Gym", 2, None))]
+        for command in commands:
+            command.execute()
+        assert schedule.tasks[0] is schedule.tasks[2]
+        commands[-1].undo()
+        assert schedule.tasks == [gym, read]
+
+    # This method checks the slot list check every strategy shares, and that the single task strategy still accepts
+    # only a 9 am start on a day that is completely free.
+    @staticmethod
+    def test_is_slot_free():
+        twentyfour_hr_sched = [None] * 24 * 7
+        twentyfour_hr_sched[10] = 1
+        for strategy in (EarliestSlotStrategy(), SingleTaskPerDayAndStartAt9Strategy()):
+            assert strategy.is_slot_free(0, twentyfour_hr_sched, 10)
+            assert not strategy.is_slot_free(8, twentyfour_hr_sched, 3)
+            assert not strategy.is_slot_free(166, twentyfour_hr_sched, 3)
+        week = Week(SingleTaskPerDayAndStartAt9Strategy())
+        week.place_task(TaskFactory.create_task("flexible", "Nap", 1, None), 30)
+        assert [week.strategy.is_available(week, hour, 2) for hour in (9, 10, 33, 57)] == [True, False, False, True]
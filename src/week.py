@@ -1,57 +1,232 @@
+from bisect import bisect_left, bisect_right
+
+# Returns a bitmask with a bit set for each of the duration hours starting at start_hour.
+def hours_mask(start_hour, duration):
+    return ((1 << duration) - 1) << start_hour
+
+# Builds the occupancy bitmask for a slot list, bit i is set when slot i has something in it.
+def occupancy_mask(twentyfour_hr_sched):
+    mask = 0
+    for hour, task in enumerate(twentyfour_hr_sched):
+        if task is not None:
+            mask |= 1 << hour
+    return mask
+
+# Builds the sorted list of maximal free runs (start, end) for an occupancy bitmask, end is exclusive. It jumps from
+# run to run with mask operations, so it does not go through the slots one at a time.
+def free_runs_from_mask(occupancy, num_hours):
+    runs = []
+    free = ~occupancy & ((1 << num_hours) - 1)
+    while free:
+        start = (free & -free).bit_length() - 1
+        shifted = free >> start
+        # the lowest zero bit of shifted is where the run ends
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        runs.append((start, start + length))
+        free &= ~hours_mask(start, length)
+    return runs
+
+# The longest horizon a week can have, the schedule results keep start slots as unsigned 16 bit numbers.
+MAX_SLOTS = 1 << 16
+
 # This class manages the free time of each of the schedules.
 class Week:
 
-    # Initiation. the week has an array of size 24*7 to schedule each hour of the week. Also takes in a strategy
-    # which dictates how it will place tasks.
-    def __init__(self, strategy):
+    # Initiation. the week has a slot for each hour of the week by default, 24*7 of them. Also takes in a strategy
+    # which dictates how it will place tasks. The length of a slot comes from the strategy's slot_minutes, so with
+    # 15 minute slots a day has 96 of them, and weeks makes the horizon that many weeks long. Start hours and
+    # durations everywhere are counted in slots.
+    def __init__(self, strategy, weeks=1):
+        self.strategy = strategy
+        self.weeks = weeks
+        self.slots_per_day = strategy.slots_per_day
+        self.num_days = 7 * weeks
+        self.num_slots = self.slots_per_day * self.num_days
+        if weeks < 1 or self.num_slots > MAX_SLOTS:
+            raise ValueError("The horizon must be between 1 week and " + str(MAX_SLOTS) + " slots.")
+        # The (start, task) of every placement, in the order they were placed. Placing and removing only touches
+        # this list and the two views below, so their cost depends on how many tasks are placed and not on how
+        # many slots the week has.
+        self.placements = []
+        # Compact view of the same week, bit i is set when slot i is taken. place_task and remove_task keep it in
+        # sync so strategies can test a run of free slots with a single mask operation.
+        self.occupancy = 0
+        # Sorted list of the maximal runs of free slots as (start, end) with end exclusive. place_task and
+        # remove_task split and merge these runs so strategies can get every opening of a given length without
+        # rescanning the week.
+        self.free_runs = [(0, self.num_slots)]
+        self.sched = None
+
+    # The week as a list with the task in each slot, or None where it is free. It is only built when something
+    # asks for it, like printing, and kept until the week changes. It must not be changed by the caller.
+    @property
+    def twentyfour_hr_sched(self):
+        if self.sched is None:
                                    #0 am  1 am 2 am
                                    # M T W R F S U
-        self.twentyfour_hr_sched = [None] * 24 * 7
-        self.strategy = strategy
+            sched = [None] * self.num_slots
+            for start_hour, task in self.placements:
+                sched[start_hour:start_hour + task.duration] = [task] * task.duration
+            # A task placed over another one and then removed freed those slots for both, like the occupancy.
+            for run_start, run_end in self.free_runs:
+                sched[run_start:run_end] = [None] * (run_end - run_start)
+            self.sched = sched
+        return self.sched
+
+    # Returns a new Week with the same strategy and its own copy of the placements. The tasks themselves are
+    # shared, so this is much cheaper than a deepcopy.
+    def copy(self):
+        week = Week(self.strategy, self.weeks)
+        week.placements = self.placements[:]
+        week.occupancy = self.occupancy
+        week.free_runs = self.free_runs[:]
+        week.sched = self.sched
+        return week
 
     # Depending on the strategy, this method returns a list of ints (times) that the task can be scheduled.
     def get_available_slots(self, duration):
-        return self.strategy.get_available_slots(self.twentyfour_hr_sched, duration)
+        return self.strategy.get_available_slots_in_week(self, duration)
     
     # place_task will take a task and place it at a start hour and block the time needed that its duration requires.
     def place_task(self, task, start_hour):
-        for hour in range(start_hour, start_hour + task.duration):
-            self.twentyfour_hr_sched[hour] = task
-            print(task.name)
-            print("placed at " + str(hour))
+        if start_hour < 0 or start_hour + task.duration > self.num_slots:
+            raise IndexError("The task does not fit in the week at that slot.")
+        self.placements.append((start_hour, task))
+        self.occupancy |= hours_mask(start_hour, task.duration)
+        self.take_free_hours(start_hour, start_hour + task.duration)
+        self.sched = None
 
     # Remove task removes a task from its start hour to how long its duration is.
     def remove_task(self, task, start_hour):
-        for hour in range(start_hour, start_hour + task.duration):
-            self.twentyfour_hr_sched[hour] = None
+        for i in range(len(self.placements) - 1, -1, -1):
+            if self.placements[i][0] == start_hour and self.placements[i][1] is task:
+                del self.placements[i]
+                break
+        self.occupancy &= ~hours_mask(start_hour, task.duration)
+        self.release_free_hours(start_hour, start_hour + task.duration)
+        self.sched = None
+
+    # Returns the free runs that are at least duration hours long, in order.
+    def get_free_runs(self, duration):
+        return [run for run in self.free_runs if run[1] - run[0] >= duration]
+
+    # Checks with the free run index whether the hours from start_hour up to start_hour + duration are all free.
+    def is_free(self, start_hour, duration):
+        i = bisect_right(self.free_runs, (start_hour, self.num_slots)) - 1
+        return i >= 0 and start_hour + duration <= self.free_runs[i][1]
+
+    # Splits the free run that contains the hours from start to end. If those hours were not all free (a task was
+    # placed over another one) the runs are rebuilt from the occupancy bitmask instead.
+    def take_free_hours(self, start, end):
+        if start >= end:
+            return
+        i = bisect_right(self.free_runs, (start, self.num_slots)) - 1
+        if i >= 0 and end <= self.free_runs[i][1]:
+            run_start, run_end = self.free_runs[i]
+            pieces = []
+            if run_start < start:
+                pieces.append((run_start, start))
+            if end < run_end:
+                pieces.append((end, run_end))
+            self.free_runs[i:i + 1] = pieces
+        else:
+            self.free_runs = free_runs_from_mask(self.occupancy, self.num_slots)
+
+    # Adds the hours from start to end back as a free run, merging it with the runs right before and after it. If
+    # some of those hours were already free the runs are rebuilt from the occupancy bitmask instead.
+    def release_free_hours(self, start, end):
+        if start >= end:
+            return
+        i = bisect_left(self.free_runs, (start, start))
+        before = self.free_runs[i - 1] if i > 0 else None
+        after = self.free_runs[i] if i < len(self.free_runs) else None
+        if (before is not None and before[1] > start) or (after is not None and after[0] < end):
+            self.free_runs = free_runs_from_mask(self.occupancy, self.num_slots)
+            return
+        first, last = i, i
+        if before is not None and before[1] == start:
+            start = before[0]
+            first = i - 1
+        if after is not None and after[0] == end:
+            end = after[1]
+            last = i + 1
+        self.free_runs[first:last] = [(start, end)]
     
     # This method prints out the week schedule in a neat way to save or display on screen.
     def print_day_tasks(self):
-        string = ""
-        for j in range(7):
-            if (j == 0):
-                string += "Monday:\n"
-            if (j == 1):
-                string += "Tuesday:\n"
-            if (j == 2):
-                string += "Wednesday:\n"
-            if (j == 3):
-                string += "Thursday:\n"
-            if (j == 4):
-                string += "Friday:\n"
-            if (j == 5):
-                string += "Saturday:\n"
-            if (j == 6):
-                string += "Sunday:\n"
-            for i in range(24):
-                if (i < 12):
-                    if self.twentyfour_hr_sched[j*24 + i] is not None:
-                        string += "\t" + str(i) + "-" + (str(i+1)) + " am: " + self.twentyfour_hr_sched[j*24 + i].name + "\n"
-                    else:
-                        string += "\t" + str(i) + "-" + (str(i+1)) + " am: " + "\n"
-                else:
-                    if self.twentyfour_hr_sched[j*24 + i] is not None:
-                        string += "\t" + str(i-12) + "-" + (str(i-11)) + " pm: " + self.twentyfour_hr_sched[j*24 + i].name + "\n"
-                    else:
-                        string += "\t" + str(i-12) + "-" + (str(i-11)) + " pm: " + "\n"
-        return string
\ No newline at end of file
+        return "".join(render_lines(self.twentyfour_hr_sched, self.slots_per_day))
+
+
+# The day headers and slot labels are the same for every week, so they are only built once.
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Returns minutes as a clock time without am/pm, like 9 or 9:15.
+def clock_time(minutes):
+    hour, minute = divmod(minutes, 60)
+    if minute == 0:
+        return str(hour)
+    return str(hour) + ":" + str(minute).zfill(2)
+
+# Returns the labels of the slots of a day for a slot length in minutes, "\t9-10 am: " for hours or
+# "\t9:15-9:30 am: " for 15 minutes.
+SLOT_LABELS = {}
+def slot_labels(slot_minutes):
+    if slot_minutes not in SLOT_LABELS:
+        labels = []
+        for start in range(0, 24 * 60, slot_minutes):
+            if start < 12 * 60:
+                labels.append("\t" + clock_time(start) + "-" + clock_time(start + slot_minutes) + " am: ")
+            else:
+                labels.append("\t" + clock_time(start - 12 * 60) + "-" + clock_time(start + slot_minutes - 12 * 60) + " pm: ")
+        SLOT_LABELS[slot_minutes] = labels
+    return SLOT_LABELS[slot_minutes]
+
+HOUR_LABELS = slot_labels(60)
+
+# Returns the header of a day, the days after the first week also say which week they are in.
+def day_name(day, num_days):
+    if num_days <= 7:
+        return DAY_NAMES[day % 7]
+    return "Week " + str(day // 7 + 1) + " " + DAY_NAMES[day % 7]
+
+# Returns the index in the rendered lines of the line for a slot of the week, each day has its header line first.
+def line_index(hour, slots_per_day=24):
+    return hour + hour // slots_per_day + 1
+
+# Returns the line for one slot of the week with the name of the task in it, if any.
+def render_hour(hour, task, labels=HOUR_LABELS):
+    if task is None:
+        return labels[hour % len(labels)] + "\n"
+    return labels[hour % len(labels)] + task.name + "\n"
+
+# Renders a slot list as the list of lines print_day_tasks joins: a header for each day followed by its slots.
+def render_lines(twentyfour_hr_sched, slots_per_day=24):
+    labels = slot_labels(24 * 60 // slots_per_day)
+    num_days = len(twentyfour_hr_sched) // slots_per_day
+    lines = []
+    for day in range(num_days):
+        lines.append(day_name(day, num_days) + ":\n")
+        for hour in range(day * slots_per_day, day * slots_per_day + slots_per_day):
+            lines.append(render_hour(hour, twentyfour_hr_sched[hour], labels))
+    return lines
+
+# This class renders many schedules that share the same fixed tasks. The lines of the fixed week are rendered once,
+# and each schedule only re-renders the hours its flexible tasks are placed in. The output is the same as
+# print_day_tasks on the full week.
+class WeekRenderer:
+    def __init__(self, fixed_week):
+        self.slots_per_day = fixed_week.slots_per_day
+        self.labels = slot_labels(24 * 60 // self.slots_per_day)
+        self.base_lines = render_lines(fixed_week.twentyfour_hr_sched, self.slots_per_day)
+
+    # Renders one schedule from its (task, start hour) placements.
+    def render(self, placements):
+        lines = self.base_lines[:]
+        for task, start_hour in placements:
+            for hour in range(start_hour, start_hour + task.duration):
+                lines[line_index(hour, self.slots_per_day)] = render_hour(hour, task, self.labels)
+        return "".join(lines)
+
+    # Renders many schedules in one call, each one given as its list of placements.
+    def render_many(self, placements_list):
+        return [self.render(placements) for placements in placements_list]